@@ -0,0 +1,15 @@
+"""
+ASGI config for autojudge.
+
+The long polling status views are async, and do not hold a thread while they wait. Serve
+them with an ASGI server to hold many waiting clients in one process; the rest of the views
+are best served with WSGI. See the installation guide for the routing.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'autojudge.settings')
+
+application = get_asgi_application()
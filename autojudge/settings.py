@@ -83,6 +83,53 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.2/ref/settings/#caches
+# The cache is shared by all the processes of the web server. The cached statuses and
+# fragments are keyed by version counters kept in the database, which change as the
+# submissions are scored, so stale entries are never read and simply expire.
+# MAX_ENTRIES fits the statuses of the submissions and the leaderboard pages of a busy
+# contest; past it, a third of the entries are removed at random on the next write.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'content', 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    }
+}
+
+
+# File downloads
+# Downloads are streamed by Django by default. To let the front web server send the files,
+# set FILE_SENDING_MODE to 'x-sendfile' (Apache with mod_xsendfile) or to 'x-accel-redirect'
+# (nginx). With nginx, X_ACCEL_REDIRECT_PREFIX is an internal location aliased to MEDIA_ROOT.
+
+FILE_SENDING_MODE = None
+X_ACCEL_REDIRECT_PREFIX = '/protected/'
+
+
+# File uploads
+# Uploaded files are always streamed to temporary files on disk, so that the memory used by
+# a request does not depend on the size of the upload. Requests larger than UPLOAD_MAX_SIZE
+# bytes are stopped.
+
+FILE_UPLOAD_HANDLERS = ['judge.uploadhandler.HashingFileUploadHandler']
+UPLOAD_MAX_SIZE = 512 * 1024 * 1024
+
+
+# Live updates
+# The pages of running submissions and contests poll for changes every STATUS_POLL_INTERVAL
+# seconds. If the status views are served with ASGI (see asgi.py), set STATUS_LONG_POLLING
+# to True, so that every poll instead waits for a change. With WSGI, a waiting poll holds a
+# worker thread.
+
+STATUS_LONG_POLLING = False
+STATUS_POLL_INTERVAL = 10
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
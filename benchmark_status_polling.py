@@ -0,0 +1,134 @@
+"""
+Load benchmark for the long polling status views, to compare serving them with WSGI and with
+ASGI. Many clients wait on the status of a submission at once, while a probe measures how long
+a plain status request takes to be answered. With WSGI, every waiting client holds a worker
+thread, and the probes queue up behind them once the threads run out. With ASGI, the waiting
+clients do not hold threads.
+
+Run the server in one of the two modes, for instance
+
+    gunicorn autojudge.wsgi --workers 4 --threads 8
+    uvicorn autojudge.asgi:application --workers 4
+
+and then run
+
+    python benchmark_status_polling.py http://localhost:8000/judge/submission/<ID>/status/ \\
+        --session <value of the sessionid cookie> --clients 1000
+
+The number of clients is limited by the number of open files, see ``ulimit -n``.
+"""
+
+import ssl
+import asyncio
+import argparse
+
+from time import monotonic
+from collections import Counter
+from urllib.parse import urlsplit
+from typing import Dict, List, Optional, Tuple
+
+# Seconds between two probes
+PROBE_INTERVAL = 0.5
+
+
+async def get(url: str, headers: Dict[str, str],
+              timeout: float) -> Tuple[int, Dict[str, str], float]:
+    # A single GET request on a new connection, returning the status, the headers and the
+    # number of seconds taken
+    parts = urlsplit(url)
+    secure = parts.scheme == 'https'
+    start = monotonic()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(
+        parts.hostname, parts.port or (443 if secure else 80),
+        ssl=ssl.create_default_context() if secure else None), timeout)
+    try:
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        lines = ['GET {} HTTP/1.1'.format(path), 'Host: {}'.format(parts.netloc),
+                 'Connection: close']
+        lines.extend('{}: {}'.format(name, value) for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        response_headers = {}
+        while True:
+            line = (await asyncio.wait_for(reader.readline(), timeout)).decode().strip()
+            if line == '':
+                break
+            name, _, value = line.partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    return int(status_line.split()[1]), response_headers, monotonic() - start
+
+
+async def long_poll(url: str, headers: Dict[str, str], etag: str, wait: int,
+                    deadline: float, statuses: Counter):
+    # Keep waiting for changes until the deadline, as a polling client would
+    poll_url = url + ('&' if '?' in url else '?') + 'wait={}'.format(wait)
+    while monotonic() < deadline:
+        try:
+            status, response_headers, _ = await get(
+                poll_url, dict(headers, **{'If-None-Match': etag}), wait + 30)
+        except (OSError, asyncio.TimeoutError) as err:
+            statuses[type(err).__name__] += 1
+            await asyncio.sleep(1)
+            continue
+        statuses[status] += 1
+        etag = response_headers.get('etag', etag)
+
+
+async def probe(url: str, headers: Dict[str, str], deadline: float,
+                latencies: List[Optional[float]]):
+    # Measure the time taken by plain status requests while the clients are waiting
+    while monotonic() < deadline:
+        try:
+            _, _, latency = await get(url, headers, deadline - monotonic() + 1)
+            latencies.append(latency)
+        except (OSError, asyncio.TimeoutError):
+            latencies.append(None)
+        await asyncio.sleep(PROBE_INTERVAL)
+
+
+async def benchmark(url: str, session: Optional[str], clients: int, wait: int,
+                    duration: float, ramp: float):
+    headers = {} if session is None else {'Cookie': 'sessionid={}'.format(session)}
+    status, response_headers, _ = await get(url, headers, 30)
+    if status != 200 or 'etag' not in response_headers:
+        raise SystemExit('Expected a status response with an ETag, got {}'.format(status))
+
+    statuses: Counter = Counter()
+    latencies: List[Optional[float]] = []
+    deadline = monotonic() + ramp + duration
+    pollers = [asyncio.ensure_future(long_poll(url, headers, response_headers['etag'], wait,
+                                               deadline, statuses))
+               for _ in range(clients)]
+    # The probes start once the waiting clients have connected
+    await asyncio.sleep(ramp)
+    await probe(url, headers, deadline, latencies)
+    await asyncio.gather(*pollers)
+
+    answered = sorted(latency for latency in latencies if latency is not None)
+    print('Waiting clients: {}, wait: {} s, duration: {} s'.format(clients, wait, duration))
+    print('Long poll responses: {}'.format(dict(statuses)))
+    print('Probes: {} answered, {} failed'.format(len(answered), len(latencies) - len(answered)))
+    if len(answered) > 0:
+        print('Probe latency: median {:.3f} s, 95th percentile {:.3f} s, max {:.3f} s'.format(
+            answered[len(answered) // 2], answered[int(len(answered) * 0.95)], answered[-1]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load benchmark for the status views')
+    parser.add_argument('url', help='URL of a submission status or a problem status view')
+    parser.add_argument('--session', help='Session cookie of a user who can see the status')
+    parser.add_argument('--clients', type=int, default=200,
+                        help='Number of clients waiting at once')
+    parser.add_argument('--wait', type=int, default=25,
+                        help='Seconds that every long poll waits')
+    parser.add_argument('--duration', type=float, default=60,
+                        help='Seconds for which the probes are run')
+    parser.add_argument('--ramp', type=float, default=5,
+                        help='Seconds given to the clients to connect before probing')
+    args = parser.parse_args()
+    asyncio.get_event_loop().run_until_complete(benchmark(
+        args.url, args.session, args.clients, args.wait, args.duration, args.ramp))
@@ -1,3 +1,4 @@
+import os
 import argparse
 import subprocess
 
@@ -9,29 +10,40 @@ parser.add_argument('--submission_config', type=str,
                             SUBMISSION_FORMAT
                             TIME_LIMIT
                             MEMORY_LIMIT
+                            RECOMPILE
                             TESTCASE_1_ID
                             TESTCASE_2_ID
                             TESTCASE_3_ID
-                            ...""")
+                            ...
+                            RECOMPILE is 1 if the submission has to be compiled again even
+                            if its executable is present, and 0 otherwise.""")
+parser.add_argument('--results_file', type=str,
+                    help="""File to which the verdicts are written. Format of this file is:
+                            TESTCASE_ID VERDICT TIME MEMORY LOGFILE
+                            ...
+                            The configuration file is left as is, so that an interrupted
+                            run can be started again.""")
 args = parser.parse_args()
 
 with open(args.submission_config) as f:
     sub_info = [x[:-1] for x in f.readlines()]
 
-# Retain the first 2 lines alone
-subprocess.call(['rm', args.submission_config])
-with open(args.submission_config, "w") as stat_file:
-    stat_file.write("{}\n{}\n".format(sub_info[0], sub_info[1]))
+# Start with no verdicts, in case this is a run started again after an interruption
+open(args.results_file, "w").close()
 
-# First compile
+# First compile, unless the executable is present from an earlier run of this submission
+executable = 'submissions/submission_{}'.format(sub_info[1])
 try:
-    subprocess.check_output(['./main_compiler.sh', sub_info[0],
-                             'submission_{}{}'.format(sub_info[1], sub_info[2])],
-                            stderr=subprocess.STDOUT)
+    if sub_info[5] == '1' and os.path.exists(executable):
+        os.remove(executable)
+    if not os.path.exists(executable):
+        subprocess.check_output(['./main_compiler.sh', sub_info[0],
+                                 'submission_{}{}'.format(sub_info[1], sub_info[2])],
+                                stderr=subprocess.STDOUT)
 except subprocess.CalledProcessError as e:  # If compilation fails, end this script here
     error_msg = str(e.output.decode('utf-8'))
-    with open(args.submission_config, "a") as stat_file:
-        for testcase_id in sub_info[5:]:
+    with open(args.results_file, "a") as stat_file:
+        for testcase_id in sub_info[6:]:
             log_file_name = 'sub_run_{}_{}.log'.format(sub_info[1], testcase_id)
 
             with open('tmp/' + log_file_name, "w") as log_file:
@@ -41,5 +53,7 @@ except subprocess.CalledProcessError as e:  # If compilation fails, end this scr
                             .format(testcase_id,
                                     'CE' if e.returncode == 1 else 'NA', log_file_name))
 else:
-    subprocess.call(['./main_tester.sh'] + sub_info[0:2] + sub_info[3:])  # run tests
-    subprocess.call(['rm', 'submissions/submission_{}'.format(sub_info[1])])  # remove executable
+    # Run tests. The executable is kept, so that the submission can be rejudged on
+    # new testcases without compiling it again; it is removed with the submission.
+    subprocess.call(['./main_tester.sh'] + sub_info[0:2] + [args.results_file] +
+                    sub_info[3:5] + sub_info[6:])
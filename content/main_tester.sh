@@ -2,10 +2,11 @@
 
 #############################################################################
 # Using this script
-#    ./main_tester.sh $PROB_CODE $SUB_ID $TIMELIMIT $MEMLIMIT [$TESTCASE_ID]+
+#    ./main_tester.sh $PROB_CODE $SUB_ID $RESULTS_FILE $TIMELIMIT $MEMLIMIT [$TESTCASE_ID]+
 # where
 # - $PROB_CODE is the problem code
 # - $SUB_ID is the submission ID
+# - $RESULTS_FILE is the file to which the verdicts are appended
 # - $TIMELIMIT is the time limit
 # - $MEMLIMIT is the memory limit
 # - $TESTCASE_ID is the testcase ID (pass atleast 1)
@@ -43,6 +44,10 @@ shift
 SUB_ID=$1
 shift
 
+# Results file
+RESULTS_FILE=$1
+shift
+
 # Time Limit
 TIMELIMIT=$1
 shift
@@ -154,7 +159,7 @@ chmod +x ${PROB_FDR}/${PROB_CODE}/test_script
 for TESTCASE_ID in "$@";
   do
     # Run the submission using run_submission
-    run_submission ${SUB_ID} ${TESTCASE_ID} ${TIMELIMIT} ${MEMLIMIT} >> ${TMP}/sub_run_${SUB_ID}.txt
+    run_submission ${SUB_ID} ${TESTCASE_ID} ${TIMELIMIT} ${MEMLIMIT} >> ${RESULTS_FILE}
 
     # Remove the generated output files
     clean_generated_output ${SUB_ID} ${TESTCASE_ID}
@@ -2,7 +2,7 @@ from django.contrib import admin
 
 # Register your models here.
 from .models import Contest, Problem, Person, Submission, TestCase, Comment
-from .models import ContestPerson, SubmissionTestCase, PersonProblemFinalScore
+from .models import ContestPerson, SubmissionTestCase, PersonProblemFinalScore, ContestPersonScore
 
 
 class ContestAdmin(admin.ModelAdmin):
@@ -18,3 +18,4 @@ admin.site.register(Comment)
 admin.site.register(ContestPerson)
 admin.site.register(SubmissionTestCase)
 admin.site.register(PersonProblemFinalScore)
+admin.site.register(ContestPersonScore)
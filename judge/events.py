@@ -0,0 +1,239 @@
+import json
+import asyncio
+
+from time import sleep, monotonic
+from threading import Lock, Thread
+from traceback import print_exc
+from queue import Queue, Empty
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from django.db import connection
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import models
+from . import handler
+
+# Seconds between two checks of the database for changes
+POLL_INTERVAL = 1
+
+# Seconds after which a comment is sent on an idle stream, so that proxies keep it open
+KEEPALIVE_INTERVAL = 15
+
+# Seconds after which a stream is closed; the browser reconnects on its own
+STREAM_LIFETIME = 5 * 60
+
+# Milliseconds the browser waits before reconnecting
+RETRY_INTERVAL = 3000
+
+# An event is a 3-tuple of the event name, the event ID and the data
+EVENT_T = Tuple[str, Optional[int], Any]
+KEY_T = Tuple[str, Any]
+
+
+class _LoopQueue(Queue):
+    """
+    Queue which wakes up a coroutine waiting in an event loop instead of a blocked thread.
+    The events themselves are not kept, as the waiting coroutine checks for the changes.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        super().__init__()
+        self.loop = loop
+        self.changed = asyncio.Event()
+
+    def put(self, item, block=True, timeout=None):
+        try:
+            self.loop.call_soon_threadsafe(self.changed.set)
+        except RuntimeError:
+            # The loop has been closed after the request was answered
+            pass
+
+
+class EventHub:
+    """
+    Fan-out of leaderboard and verdict changes to the clients listening on the event streams.
+
+    A single thread per process polls the database for all the contests and submissions
+    being listened to, so the load on the database does not grow with the number of clients.
+    The scores are changed by the submission watcher, which is a separate process, and hence
+    the changes are picked up from the database and not published in-process.
+    """
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._lock = Lock()
+        self._listeners: Dict[KEY_T, Set[Queue]] = {}
+        # Last seen state for every key: the scores version for a contest,
+        # and the scores and verdicts for a submission
+        self._states: Dict[KEY_T, Any] = {}
+        self._thread: Optional[Thread] = None
+
+    def subscribe(self, key: KEY_T, state: Any, queue: Optional[Queue] = None) -> Queue:
+        """
+        Start listening to the changes for a key.
+
+        :param key: ``('contest', contest_id)`` or ``('submission', submission_id)``
+        :param state: State of the key as seen by the listener. It is used as the
+                      starting point if no one else is listening to the key.
+        :param queue: Queue in which the events are put, to listen to many keys at once.
+                      A new queue is created if not provided.
+        :returns: Queue in which the events for the key are put
+        """
+        if queue is None:
+            queue = Queue()
+        with self._lock:
+            if key not in self._listeners:
+                self._listeners[key] = set()
+                self._states[key] = state
+            self._listeners[key].add(queue)
+            if self._thread is None:
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return queue
+
+    def unsubscribe(self, key: KEY_T, queue: Queue):
+        """
+        Stop listening to the changes for a key.
+
+        :param key: Key passed to :meth:`subscribe`
+        :param queue: Queue returned by :meth:`subscribe`
+        """
+        with self._lock:
+            listeners = self._listeners.get(key)
+            if listeners is None:
+                return
+            listeners.discard(queue)
+            if len(listeners) == 0:
+                del self._listeners[key]
+                del self._states[key]
+
+    def publish(self, key: KEY_T, event: EVENT_T):
+        with self._lock:
+            listeners = list(self._listeners.get(key, ()))
+        for queue in listeners:
+            queue.put(event)
+
+    def _run(self):
+        try:
+            while True:
+                sleep(self.poll_interval)
+                with self._lock:
+                    if len(self._listeners) == 0:
+                        self._thread = None
+                        return
+                    states = dict(self._states)
+                try:
+                    self.poll(states)
+                except Exception:
+                    print_exc()
+        finally:
+            connection.close()
+
+    def poll(self, states: Dict[KEY_T, Any]):
+        """
+        Check the database once for changes to the given keys, and publish the events.
+
+        :param states: Last seen state of the keys
+        """
+        contests = {key[1]: state for key, state in states.items() if key[0] == 'contest'}
+        if len(contests) > 0:
+            for contest_id, version in models.Contest.objects.filter(
+                    pk__in=contests.keys()).values_list('pk', 'scores_version'):
+                if version != contests[contest_id]:
+                    version, changes = handler.get_leaderboard_changes(
+                        contest_id, contests[contest_id])
+                    self._update(('contest', contest_id), version)
+                    if len(changes) > 0:
+                        self.publish(('contest', contest_id), ('leaderboard', version, changes))
+
+        submissions = {key[1]: state for key, state in states.items()
+                       if key[0] == 'submission'}
+        if len(submissions) > 0:
+            for submission_id, status in handler.get_submission_verdicts(
+                    list(submissions.keys())).items():
+                if status != submissions[submission_id]:
+                    self._update(('submission', submission_id), status)
+                    self.publish(('submission', submission_id), ('verdict', None, status))
+
+    def _update(self, key: KEY_T, state: Any):
+        with self._lock:
+            if key in self._states:
+                self._states[key] = state
+
+    def listen(self, key: KEY_T, state: Any,
+               catch_up: Callable[[], List[EVENT_T]]) -> Iterator[str]:
+        """
+        Generator of a stream of Server-Sent Events for a key, to be used as the content of
+        a ``StreamingHttpResponse``.
+
+        :param key: Key passed to :meth:`subscribe`
+        :param state: State passed to :meth:`subscribe`
+        :param catch_up: Function returning the events that the listener has missed before
+                         subscribing. It is called after subscribing, so that no change is
+                         missed in between.
+        """
+        queue = self.subscribe(key, state)
+        try:
+            yield 'retry: {}\n\n'.format(RETRY_INTERVAL)
+            for event in catch_up():
+                yield format_event(event)
+            deadline = monotonic() + STREAM_LIFETIME
+            while monotonic() < deadline:
+                try:
+                    event = queue.get(timeout=KEEPALIVE_INTERVAL)
+                except Empty:
+                    yield ': keepalive\n\n'
+                else:
+                    yield format_event(event)
+        finally:
+            self.unsubscribe(key, queue)
+
+    async def wait(self, states: Dict[KEY_T, Any], timeout: float,
+                   changed: Callable[[], Awaitable[bool]]) -> bool:
+        """
+        Wait until any of the given keys changes, as used for long polling. No thread is held
+        while waiting, so that a process served with ASGI can hold many waiting clients.
+
+        :param states: State of every key as seen by the listener, as for :meth:`subscribe`
+        :param timeout: Maximum number of seconds to wait
+        :param changed: Coroutine function checking whether the change that the listener is
+                        waiting for has happened. It is called after subscribing, so that no
+                        change is missed in between, and after every event.
+        :returns: ``True`` if :attr:`changed` returned ``True`` before the timeout
+        """
+        queue = _LoopQueue(asyncio.get_running_loop())
+        for key, state in states.items():
+            self.subscribe(key, state, queue)
+        try:
+            deadline = monotonic() + timeout
+            while not await changed():
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(queue.changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return False
+                queue.changed.clear()
+            return True
+        finally:
+            for key in states:
+                self.unsubscribe(key, queue)
+
+
+def format_event(event: EVENT_T) -> str:
+    """
+    Format an event as per the Server-Sent Events protocol.
+
+    :param event: 3-tuple of the event name, the event ID (or ``None``) and the data,
+                  which is sent as JSON
+    """
+    name, event_id, data = event
+    lines = ['event: {}'.format(name)]
+    if event_id is not None:
+        lines.append('id: {}'.format(event_id))
+    lines.append('data: {}'.format(json.dumps(data, cls=DjangoJSONEncoder)))
+    return '\n'.join(lines) + '\n\n'
+
+
+hub = EventHub()
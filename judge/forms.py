@@ -1,3 +1,6 @@
+from csv import reader as csvreader
+from codecs import iterdecode
+
 from django import forms
 from django.core.validators import RegexValidator, validate_email, EMPTY_VALUES
 
@@ -151,11 +154,49 @@ class AddPersonToContestForm(forms.Form):
     """
 
     emails = MultiEmailField(
-        label='Emails',
+        label='Emails', required=False,
         widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         help_text='Enter emails separated using commas')
     """Email ID of the person"""
 
+    emails_file = forms.FileField(label='Emails file', required=False, allow_empty_file=False,
+                                  widget=forms.FileInput(attrs={'class': 'form-control-file'}),
+                                  help_text='Or upload a CSV file with an email in the first \
+                                             column of every row.')
+    """CSV file of email IDs of the persons"""
+
+    def clean_emails_file(self):
+        emails_file = self.cleaned_data.get('emails_file')
+        if emails_file is None:
+            return []
+        emails = []
+        # The file is read a line at a time, so that large rosters are not loaded at once
+        try:
+            for line_number, row in enumerate(csvreader(iterdecode(emails_file, 'utf-8-sig')),
+                                              start=1):
+                if len(row) == 0 or row[0].strip() == '':
+                    continue
+                email = row[0].strip()
+                try:
+                    validate_email(email)
+                except forms.ValidationError:
+                    if line_number == 1:
+                        # Skip the header row
+                        continue
+                    raise forms.ValidationError("'{}' on line {} is not a valid email address."
+                                                .format(email, line_number))
+                emails.append(email)
+        except UnicodeDecodeError:
+            raise forms.ValidationError('The file is not a UTF-8 encoded CSV file.')
+        return emails
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if (not self.errors and len(cleaned_data.get('emails', [])) == 0 and
+                len(cleaned_data.get('emails_file', [])) == 0):
+            raise forms.ValidationError('Enter emails or upload a file of emails.')
+        return cleaned_data
+
 
 class DeletePersonFromContestForm(forms.Form):
     """
@@ -326,6 +367,20 @@ class AddTestCaseForm(forms.Form):
     """TestCase Output"""
 
 
+class AddTestCaseArchiveForm(forms.Form):
+    """
+    Form to create many TestCases from an archive
+    """
+
+    archive = forms.FileField(label='Test case archive', allow_empty_file=False, required=True,
+                              help_text='Upload a zip or tar archive with a pair of files '
+                                        '<code>name.in</code> and <code>name.out</code> for '
+                                        'every test case. The test cases in a directory named '
+                                        '<code>public</code> are public, and the rest are '
+                                        'private.')
+    """TestCase Archive"""
+
+
 class NewCommentForm(forms.Form):
     """
     Form to add a new comment
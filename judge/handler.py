@@ -1,22 +1,63 @@
 import os
-import pickle
+import tarfile
+import zipfile
 
-from io import StringIO
+from threading import Lock, Thread
+from functools import partial
+from contextlib import contextmanager
 from traceback import print_exc
 from csv import writer as csvwriter
+from uuid import uuid4
+from hashlib import sha256
 from shutil import rmtree, copyfile
 from datetime import timedelta, datetime
-from typing import Tuple, Optional, Dict, Any, List, Union
+from typing import Tuple, Optional, Dict, Any, List, Union, Iterator, Callable, Set
 
 from django.utils import timezone
-from django.db.models import Q, Sum, Max
+from django.core.cache import cache
+from django.db import transaction, connection
+from django.db.models import Q, Sum, Max, F, Value, Case, When, OuterRef, Subquery, Count
+from django.db.models import ExpressionWrapper, FloatField, BooleanField, Exists, IntegerField
+from django.db.models.functions import Greatest, Coalesce
 from django.core.exceptions import ValidationError
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadedfile import UploadedFile
 
 from . import models
 
 STATUS_AND_OPT_ERROR_T = Tuple[bool, Optional[ValidationError]]
 
+# Score matrices are also invalidated by the version of the contest, so this only
+# bounds the lifetime of matrices of old versions
+SCORE_MATRIX_CACHE_TIMEOUT = 60 * 60
+
+# Statuses of judged submissions are invalidated whenever they are rescored
+SUBMISSION_STATUS_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Cache key of the version of the list of contests, see get_contest_list_version
+CONTEST_LIST_VERSION_KEY = 'contest_list_version'
+
+# Rows inserted per query by bulk creations, which keeps the number of
+# query parameters within the limits of SQLite
+BULK_CREATE_BATCH_SIZE = 400
+
+# Rows deleted per query while purging deleted contests and problems
+DELETE_BATCH_SIZE = 500
+
+# Testcases are previewed on the problem page by at most these many bytes and lines
+# from the beginning of their files; the full files are only downloaded
+TESTCASE_PREVIEW_SIZE = 1000
+TESTCASE_PREVIEW_LINES = 20
+
+# Limits on the test case archives, checked before anything is extracted
+TESTCASE_ARCHIVE_MAX_FILES = 2000
+TESTCASE_ARCHIVE_MAX_SIZE = 1024 * 1024 * 1024
+
+# Bytes copied at a time while extracting a test case archive
+TESTCASE_ARCHIVE_CHUNK_SIZE = 64 * 1024
+
+# Only one purge runs at a time in a process
+_PURGE_LOCK = Lock()
+
 
 def _check_and_remove(*fullpaths):
     for fullpath in fullpaths:
@@ -24,6 +65,36 @@ def _check_and_remove(*fullpaths):
             os.remove(fullpath)
 
 
+def _file_preview(field_file) -> str:
+    # Only the beginning of the file is read, however large it is
+    with field_file.open('rb') as f:
+        head = f.read(TESTCASE_PREVIEW_SIZE + 1)
+    lines = head[:TESTCASE_PREVIEW_SIZE].split(b'\n')
+    truncated = len(head) > TESTCASE_PREVIEW_SIZE or len(lines) > TESTCASE_PREVIEW_LINES
+    preview = b'\n'.join(lines[:TESTCASE_PREVIEW_LINES]).decode('utf-8', errors='replace')
+    return preview + '\n...' if truncated else preview
+
+
+def _file_hash(uploaded_file: UploadedFile) -> str:
+    # The hash computed by the upload handler while the file was received is used if present
+    content_hash = getattr(uploaded_file, 'content_hash', None)
+    if content_hash is None:
+        hasher = sha256()
+        for chunk in uploaded_file.chunks():
+            hasher.update(chunk)
+        content_hash = hasher.hexdigest()
+    return content_hash
+
+
+def _copy_and_hash(source, target) -> str:
+    # Copy a file in chunks, and return the hash of its content
+    hasher = sha256()
+    for chunk in iter(partial(source.read, TESTCASE_ARCHIVE_CHUNK_SIZE), b''):
+        hasher.update(chunk)
+        target.write(chunk)
+    return hasher.hexdigest()
+
+
 def process_contest(contest_name: str, contest_start: datetime, contest_soft_end: datetime,
                     contest_hard_end: datetime, penalty: float, is_public: bool,
                     enable_linter_score: bool,
@@ -62,45 +133,35 @@ def process_contest(contest_name: str, contest_start: datetime, contest_soft_end
         return (False, ValidationError('Contest could not be created due '
                                        'to the following reason: {}'.format(str(other_err))))
     else:
+        bump_contest_list_version()
         return (True, str(new_contest.pk))
 
 
-def delete_contest(contest_id: int) -> STATUS_AND_OPT_ERROR_T:
+def delete_contest(contest_id: int, background: bool = False) -> STATUS_AND_OPT_ERROR_T:
     """
     Function to delete a :class:`~judge.models.Contest` given its contest ID.
     This will cascade delete in all the tables that have :attr:`contest_id` as a foreign key.
-    It calls :func:`delete_problem` for each problem in the contest.
+    It deletes all the problems in the contest, as done by :func:`delete_problem`.
+
+    The contest is hidden right away, and the rows are deleted in batches
+    by :func:`purge_deleted`.
 
     :param contest_id: the contest ID
+    :param background: If ``True``, then the deletion is done in a background thread, and
+                       the progress can be followed using :func:`get_deletion_progress`.
     :returns: A 2-tuple - 1st element indicating whether the deletion has succeeded, and
               2nd element providing a ``ValidationError`` if deletion is unsuccessful.
     """
-    contest = models.Contest.objects.filter(pk=contest_id)
-    if not contest.exists():
+    if models.Contest.objects.filter(pk=contest_id).update(deleted=True) == 0:
         return (False, ValidationError('Contest with ID = {} not found'
                                        .format(contest_id)))
-    contest = contest[0]
-    problems = models.Problem.objects.filter(contest=contest)
-    for problem in problems:
-        delete_problem(problem.pk)
-    if os.path.exists(os.path.join('content', 'contests', str(contest_id))):
-        rmtree(os.path.join('content', 'contests', str(contest_id)))
-
-    try:
-        models.Contest.objects.filter(pk=contest_id).delete()
-    # Catch any weird errors that might pop up during the deletion
-    except Exception as other_err:
-        print_exc()
-        return (False,
-                ValidationError('Contest could not be deleted '
-                                'due to the following error = {}'.format(str(other_err))))
-    else:
-        return (True, None)
+    bump_contest_list_version()
+    return _start_purge(background, 'Contest')
 
 
 def process_problem(contest_id: int,
                     **kwargs: Union[str, int,
-                                    Optional[InMemoryUploadedFile]]) -> STATUS_AND_OPT_ERROR_T:
+                                    Optional[UploadedFile]]) -> STATUS_AND_OPT_ERROR_T:
     """
     Function to process a new :class:`~judge.models.Problem`.
 
@@ -128,13 +189,13 @@ def process_problem(contest_id: int,
     :param file_exts: Accepted file format for submissions
     :type statement: str
     :param starting_code: Starting code for the problem
-    :type statement: Optional[InMemoryUploadedFile]
+    :type statement: Optional[UploadedFile]
     :param max_score: Maximum judge score per test case for the problem
     :type statement: int
     :param compilation_script: Compilation script for the submissions
-    :type statement: Optional[InMemoryUploadedFile]
+    :type statement: Optional[UploadedFile]
     :param test_script: Test script for the submissions
-    :type statement: Optional[InMemoryUploadedFile]
+    :type statement: Optional[UploadedFile]
     :returns: A 2-tuple - 1st element indicating whether the processing has succeeded, and
               2nd element providing a ``ValidationError`` if processing is unsuccessful.
     """
@@ -206,6 +267,7 @@ def process_problem(contest_id: int,
         print_exc()
         return (False, ValidationError(str(other_err)))
     else:
+        bump_content_version(new_problem.contest_id)
         return (True, None)
 
 
@@ -243,56 +305,189 @@ def update_problem(code: str, name: str, statement: str, input_format: str,
         print_exc()
         return (False, ValidationError(str(other_err)))
     else:
+        bump_content_version(problem.contest_id)
         return (True, None)
 
 
-def delete_problem(problem_id: str) -> STATUS_AND_OPT_ERROR_T:
+def delete_problem(problem_id: str, background: bool = False) -> STATUS_AND_OPT_ERROR_T:
     """
     Function to delete a :class:`~judge.models.Problem` given its problem ID.
     This will cascade delete in all the tables that have :attr:`problem_id` as a foreign key.
     It will also delete all the submissions, testcases and related
     directories corresponding to the problem.
 
+    The problem is hidden right away, and the rows are deleted in batches
+    by :func:`purge_deleted`.
+
     :param problem_id: the problem ID
+    :param background: If ``True``, then the deletion is done in a background thread.
     :returns: A 2-tuple - 1st element indicating whether the deletion has succeeded, and
               2nd element providing a ``ValidationError`` if deletion is unsuccessful.
     """
     problem = models.Problem.objects.filter(code=problem_id)
-    if not problem.exists():
+    if problem.update(deleted=True) == 0:
         return (False, ValidationError('Problem with code = {} not found'
                                        .format(problem_id)))
-    problem = problem[0]
+    bump_content_version(problem.values_list('contest', flat=True)[0])
+    return _start_purge(background, 'Problem')
 
-    # First delete all the files stored corresponding to this problem
-    testcases = models.TestCase.objects.filter(problem=problem)
-    for testcase in testcases:
-        inputfile_path = os.path.join(
-            'content', 'testcase', 'inputfile_{}.txt'.format(testcase.pk))
-        outputfile_path = os.path.join(
-            'content', 'testcase', 'outputfile_{}.txt'.format(testcase.pk))
-        _check_and_remove(inputfile_path, outputfile_path)
-
-    submissions = models.Submission.objects.filter(problem=problem)
-    for submission in submissions:
-        submission_path = os.path.join(
-            'content', 'submissions',
-            'submission_{}{}'.format(submission.pk, submission.file_type))
-        _check_and_remove(submission_path)
-
-    rmtree(os.path.join('content', 'problems', problem_id))
 
+def _start_purge(background: bool, kind: str) -> STATUS_AND_OPT_ERROR_T:
+    if background:
+        Thread(target=_purge_deleted_in_background, daemon=True).start()
+        return (True, None)
     try:
-        models.Problem.objects.filter(code=problem_id).delete()
+        purge_deleted()
     # Catch any weird errors that might pop up during the deletion
     except Exception as other_err:
         print_exc()
         return (False,
-                ValidationError('Problem could not be deleted '
-                                'due to the following error = {}'.format(str(other_err))))
+                ValidationError('{} could not be deleted '
+                                'due to the following error = {}'.format(kind, str(other_err))))
     else:
         return (True, None)
 
 
+def _purge_deleted_in_background():
+    try:
+        purge_deleted()
+    except Exception:
+        # The deletion is resumed by the next purge
+        print_exc()
+    finally:
+        connection.close()
+
+
+def _delete_in_batches(queryset, log: Callable[[str], None], description: str):
+    # Bounded batches keep every delete short, so that the database is not locked for long
+    model = queryset.model
+    while True:
+        batch = list(queryset.values_list('pk', flat=True)[:DELETE_BATCH_SIZE])
+        if len(batch) == 0:
+            return
+        model.objects.filter(pk__in=batch).delete()
+        log('Deleted {} {}'.format(len(batch), description))
+
+
+def _rejudge_jobs(submission_ids: List[str],
+                  prefixes: Tuple[str, ...] = ('sub_rejudge_', 'sub_bulk_')) -> List[str]:
+    # Names of the queued rejudge jobs of the submissions, see _queue_job
+    ids = set(str(submission_id) for submission_id in submission_ids)
+    tmp_dir = os.path.join('content', 'tmp')
+    if not os.path.exists(tmp_dir):
+        return []
+    return [job for job in os.listdir(tmp_dir)
+            if job.startswith(prefixes) and job.endswith('.txt') and
+            job.split('_')[2] in ids]
+
+
+def _running_submissions(submission_ids: List[str]) -> Set[str]:
+    # IDs of the submissions being judged by the submission watcher, which marks each of
+    # them with a file running_ID in content/tmp while its container runs
+    ids = set(str(submission_id) for submission_id in submission_ids)
+    tmp_dir = os.path.join('content', 'tmp')
+    if not os.path.exists(tmp_dir):
+        return set()
+    return set(name[len('running_'):] for name in os.listdir(tmp_dir)
+               if name.startswith('running_') and name[len('running_'):] in ids)
+
+
+def _purge_problem(problem_id: str, log: Callable[[str], None]):
+    submissions = models.Submission.objects.filter(problem=problem_id)
+    while True:
+        batch = list(submissions.values_list('pk', 'file_type')[:DELETE_BATCH_SIZE])
+        if len(batch) == 0:
+            break
+        # Submissions waiting to be judged are removed from the queue as well. The job files
+        # of the submissions being judged are in use by their containers, and are left to
+        # the submission watcher, which drops the results of deleted submissions.
+        running = _running_submissions([pk for pk, _ in batch])
+        waiting = [pk for pk, _ in batch if str(pk) not in running]
+        _check_and_remove(*[os.path.join('content', 'submissions',
+                                         'submission_{}{}'.format(pk, ext))
+                            for pk, file_type in batch for ext in (file_type, '')],
+                          *[os.path.join('content', 'tmp', 'sub_run_{}.txt'.format(pk))
+                            for pk in waiting],
+                          *[os.path.join('content', 'tmp', job)
+                            for job in _rejudge_jobs(waiting)])
+        models.Submission.objects.filter(pk__in=[pk for pk, _ in batch]).delete()
+        log('Deleted {} submissions of problem {}'.format(len(batch), problem_id))
+
+    testcases = models.TestCase.objects.filter(problem=problem_id)
+    while True:
+        testcase_batch = list(testcases.values_list('pk', flat=True)[:DELETE_BATCH_SIZE])
+        if len(testcase_batch) == 0:
+            break
+        _check_and_remove(*[os.path.join('content', 'testcase', '{}file_{}.txt'.format(
+            prefix, pk)) for pk in testcase_batch for prefix in ('input', 'output')])
+        models.TestCase.objects.filter(pk__in=testcase_batch).delete()
+        log('Deleted {} testcases of problem {}'.format(len(testcase_batch), problem_id))
+
+    _delete_in_batches(models.Comment.objects.filter(problem=problem_id), log,
+                       'comments of problem {}'.format(problem_id))
+    _delete_in_batches(models.PersonProblemFinalScore.objects.filter(problem=problem_id), log,
+                       'scores of problem {}'.format(problem_id))
+    if os.path.exists(os.path.join('content', 'problems', problem_id)):
+        rmtree(os.path.join('content', 'problems', problem_id))
+    models.Problem.objects.filter(code=problem_id).delete()
+    log('Deleted problem {}'.format(problem_id))
+
+
+def _purge_contest(contest_id: int, log: Callable[[str], None]):
+    for problem_id in models.Problem.objects.filter(contest=contest_id).values_list(
+            'code', flat=True):
+        _purge_problem(problem_id, log)
+    _delete_in_batches(models.ContestPersonScore.objects.filter(contest=contest_id), log,
+                       'scores of contest {}'.format(contest_id))
+    _delete_in_batches(models.ContestPerson.objects.filter(contest=contest_id), log,
+                       'persons of contest {}'.format(contest_id))
+    if os.path.exists(os.path.join('content', 'contests', str(contest_id))):
+        rmtree(os.path.join('content', 'contests', str(contest_id)))
+    models.Contest.objects.filter(pk=contest_id).delete()
+    log('Deleted contest {}'.format(contest_id))
+
+
+def purge_deleted(log: Optional[Callable[[str], None]] = None):
+    """
+    Function to delete the contests and problems which have been marked for deletion by
+    :func:`delete_contest` and :func:`delete_problem`. The rows are deleted in batches,
+    and an interrupted purge can be resumed by calling this function again.
+
+    :param log: Function called with a message about the progress after every batch.
+    """
+    def ignore(message: str):
+        pass
+
+    log = log or ignore
+    with _PURGE_LOCK:
+        for problem_id, contest_id in models.Problem.objects.filter(
+                deleted=True, contest__deleted=False).values_list('code', 'contest'):
+            _purge_problem(problem_id, log)
+            if contest_id is not None:
+                rebuild_leaderboard(contest_id)
+        for contest_id in models.Contest.objects.filter(deleted=True).values_list(
+                'pk', flat=True):
+            _purge_contest(contest_id, log)
+
+
+def get_deletion_progress(contest_id: int) -> Optional[Dict[str, int]]:
+    """
+    Function to get the progress of the deletion of a contest.
+
+    :param contest_id: the contest ID
+    :returns: ``None`` if the contest does not exist anymore, otherwise a dictionary with
+              the number of ``problems``, ``submissions`` and ``testcases`` that are yet
+              to be deleted.
+    """
+    if not models.Contest.objects.filter(pk=contest_id).exists():
+        return None
+    return {
+        'problems': models.Problem.objects.filter(contest=contest_id).count(),
+        'submissions': models.Submission.objects.filter(problem__contest=contest_id).count(),
+        'testcases': models.TestCase.objects.filter(problem__contest=contest_id).count(),
+    }
+
+
 def process_person(email: str, rank: int = 0) -> STATUS_AND_OPT_ERROR_T:
     """
     Function to process a new :class:`~judge.models.Person`.
@@ -318,15 +513,16 @@ def process_person(email: str, rank: int = 0) -> STATUS_AND_OPT_ERROR_T:
 
 
 def process_testcase(problem_id: str, test_type: str,
-                     input_file: InMemoryUploadedFile,
-                     output_file: InMemoryUploadedFile) -> STATUS_AND_OPT_ERROR_T:
+                     input_file: UploadedFile,
+                     output_file: UploadedFile) -> STATUS_AND_OPT_ERROR_T:
     """
     Function to process a new :class:`~judge.models.TestCase` for a problem.
+    The beginnings of its files are stored as previews to be shown on the problem page.
 
-    .. warning::
-        This function does not rescore all the submissions and so score will not
-        change in response to the new testcase. Do not call this function once the
-        contest has started, it will lead to erroneous scores.
+    The existing submissions of the problem are rejudged on the new testcase alone, and
+    their scores are updated as and when the submission watcher saves the verdicts.
+    A testcase whose files are identical to those of an existing testcase of the problem,
+    as found by the SHA-256 hashes of the files, is not added.
 
     :param problem_id: Problem ID to which the testcase is added.
     :param test_type: Type of testcase - one of `public`, `private`.
@@ -342,11 +538,213 @@ def process_testcase(problem_id: str, test_type: str,
                                 .format(problem_id)))
     problem = problem[0]
 
+    input_hash, output_hash = _file_hash(input_file), _file_hash(output_file)
+    if models.TestCase.objects.filter(problem=problem, input_hash=input_hash,
+                                      output_hash=output_hash).exists():
+        return (False, ValidationError('This test case has already been added to the problem'))
+
     try:
-        t = problem.testcase_set.create(
-            public=(test_type == 'public'), inputfile=input_file, outputfile=output_file)
-        t.save()
+        with transaction.atomic():
+            t = problem.testcase_set.create(
+                public=(test_type == 'public'), inputfile=input_file, outputfile=output_file,
+                input_hash=input_hash, output_hash=output_hash)
+            t.input_preview = _file_preview(t.inputfile)
+            t.output_preview = _file_preview(t.outputfile)
+            t.save(update_fields=['input_preview', 'output_preview'])
+            _judge_on_new_testcases(problem, [t.pk])
     # Catch any weird errors that might pop up during the creation
+    except Exception as other_err:
+        print_exc()
+        return (False, ValidationError(str(other_err)))
+    else:
+        bump_content_version(problem.contest_id)
+        return (True, None)
+
+
+def _judge_on_new_testcases(problem: models.Problem, testcase_ids: List[str]):
+    # Mark the existing submissions as running on the new testcases, and queue their
+    # rejudge once the transaction that created the testcases is committed
+    submissions = list(models.Submission.objects.filter(problem=problem)
+                       .values_list('pk', 'file_type'))
+    models.Submission.objects.filter(problem=problem).update(version=F('version') + 1)
+    models.SubmissionTestCase.objects.bulk_create(
+        [models.SubmissionTestCase(submission_id=submission_id, testcase_id=testcase_id,
+                                   verdict='R', memory_taken=0,
+                                   time_taken=timedelta(seconds=0))
+         for submission_id, _ in submissions for testcase_id in testcase_ids],
+        batch_size=BULK_CREATE_BATCH_SIZE)
+    transaction.on_commit(lambda: _queue_rejudge(problem, submissions, testcase_ids))
+
+
+@contextmanager
+def _open_archive(archive_file: UploadedFile) -> Iterator[List[Tuple[str, int, Callable]]]:
+    # Gives the name, the size and a function opening each regular file of a zip or a
+    # tar archive. The members are read straight from the archive, one at a time.
+    archive_file.seek(0)
+    if zipfile.is_zipfile(archive_file):
+        archive_file.seek(0)
+        with zipfile.ZipFile(archive_file) as archive:
+            yield [(info.filename, info.file_size, partial(archive.open, info))
+                   for info in archive.infolist() if not info.is_dir()]
+    else:
+        archive_file.seek(0)
+        with tarfile.open(fileobj=archive_file, mode='r:*') as tar_archive:
+            yield [(member.name, member.size, partial(tar_archive.extractfile, member))
+                   for member in tar_archive.getmembers() if member.isfile()]
+
+
+def process_testcase_archive(problem_id: str,
+                             archive: UploadedFile) -> Tuple[bool, Union[ValidationError, int]]:
+    """
+    Function to add many test cases to a problem at once from a zip or a tar archive.
+
+    Every test case is a pair of files named ``<name>.in`` and ``<name>.out``, and the test
+    case is public if the pair is in a directory named ``public``, and private otherwise.
+    Other files in the archive, including hidden files and the ``__MACOSX`` directory added
+    by macOS, are ignored, and so are the test cases which are identical to an existing test
+    case of the problem. The files are copied from the archive to the test
+    case directory in chunks, and all the test cases are created in one transaction.
+    As with :func:`process_testcase`, the existing submissions are judged on the new test
+    cases, with one job per submission.
+
+    :param problem_id: Problem ID to which the testcases are added.
+    :param archive: Zip or tar archive, which may be compressed.
+    :returns: A 2-tuple - 1st element indicating whether the processing has succeeded.
+              If successful, the number of test cases added is returned, and if
+              unsuccessful, a ``ValidationError`` is returned.
+    """
+    problem = models.Problem.objects.filter(code=problem_id, deleted=False).first()
+    if problem is None:
+        return (False, ValidationError('Problem with code = {} not found'.format(problem_id)))
+
+    try:
+        with _open_archive(archive) as members:
+            return _extract_testcases(problem, members)
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError):
+        return (False, ValidationError('The file is not a valid zip or tar archive'))
+
+
+def _extract_testcases(problem: models.Problem, members: List[Tuple[str, int, Callable]]
+                       ) -> Tuple[bool, Union[ValidationError, int]]:
+    # The pairs are found from the listing of the archive before anything is extracted
+    pairs: Dict[str, Dict[str, Callable]] = {}
+    num_files = 0
+    total_size = 0
+    for name, size, open_member in members:
+        stem, extension = os.path.splitext(name)
+        if extension not in ('.in', '.out'):
+            continue
+        # Hidden files, such as the ._NAME resource forks and the __MACOSX/ directory
+        # added to zip archives by macOS, are not test cases
+        if any(part == '__MACOSX' or (part.startswith('.') and part != '.')
+               for part in name.split('/')):
+            continue
+        num_files += 1
+        total_size += size
+        pairs.setdefault(stem, {})[extension] = open_member
+    if num_files > TESTCASE_ARCHIVE_MAX_FILES:
+        return (False, ValidationError('The archive has more than {} test case files'
+                                       .format(TESTCASE_ARCHIVE_MAX_FILES)))
+    if total_size > TESTCASE_ARCHIVE_MAX_SIZE:
+        return (False, ValidationError('The test case files in the archive are larger than '
+                                       '{} bytes in total'.format(TESTCASE_ARCHIVE_MAX_SIZE)))
+    unpaired = sorted(stem for stem, files in pairs.items() if len(files) != 2)
+    if len(unpaired) > 0:
+        return (False, ValidationError('Test cases without both .in and .out files: {}'
+                                       .format(', '.join(unpaired[:10]))))
+    if len(pairs) == 0:
+        return (False, ValidationError('No test cases were found in the archive'))
+
+    # Test cases which are already in the problem, or repeated in the archive, are skipped
+    known_hashes = set(models.TestCase.objects.filter(problem=problem).values_list(
+        'input_hash', 'output_hash'))
+    testcases = []
+    written_paths: List[str] = []
+    try:
+        os.makedirs(os.path.join('content', 'testcase'), exist_ok=True)
+        for stem in sorted(pairs):
+            t = models.TestCase(problem=problem, public='public' in stem.split('/')[:-1])
+            paths = [models.testcase_upload_location(t, None, is_input)
+                     for is_input in (True, False)]
+            written_paths.extend(paths)
+            hashes = []
+            for path, extension in zip(paths, ('.in', '.out')):
+                with pairs[stem][extension]() as source, open(path, 'wb') as target:
+                    hashes.append(_copy_and_hash(source, target))
+            if tuple(hashes) in known_hashes:
+                _check_and_remove(*paths)
+                continue
+            known_hashes.add(tuple(hashes))
+            t.inputfile, t.outputfile = paths
+            t.input_hash, t.output_hash = hashes
+            t.input_preview = _file_preview(t.inputfile)
+            t.output_preview = _file_preview(t.outputfile)
+            testcases.append(t)
+        if len(testcases) == 0:
+            return (True, 0)
+
+        with transaction.atomic():
+            models.TestCase.objects.bulk_create(testcases, batch_size=BULK_CREATE_BATCH_SIZE)
+            _judge_on_new_testcases(problem, [t.pk for t in testcases])
+    # Catch any weird errors that might pop up during the extraction or the creation
+    except Exception as other_err:
+        print_exc()
+        _check_and_remove(*written_paths)
+        return (False, ValidationError(str(other_err)))
+    else:
+        bump_content_version(problem.contest_id)
+        return (True, len(testcases))
+
+
+def _queue_rejudge(problem: models.Problem, submissions: List[Tuple[str, str]],
+                   testcase_ids: List[str]):
+    # Every submission gets its own job, which runs only the given testcases.
+    # The executable compiled in the first run of the submission is reused. The jobs run in
+    # the low-priority lane of the submission watcher, after any new submissions.
+    for submission_id, file_type in submissions:
+        _queue_job('sub_rejudge_{}_{}'.format(submission_id, uuid4().hex), problem,
+                   submission_id, file_type, testcase_ids)
+
+
+def rejudge_problem(problem_id: str) -> STATUS_AND_OPT_ERROR_T:
+    """
+    Function to rejudge all the submissions of a problem on all its testcases, for instance
+    after its test script has been fixed.
+
+    The submissions are queued in a separate low-priority lane of the submission watcher,
+    which uses a capped number of workers and does not delay the judging of new
+    submissions. The queued jobs are files, so an interrupted rejudge resumes when the
+    watcher is restarted. The verdicts and scores of every submission are replaced in one
+    transaction once it is rejudged, and the scores may decrease as well.
+
+    :param problem_id: Problem ID
+    :returns: A 2-tuple - 1st element indicating whether the rejudge has been queued, and
+              2nd element providing a ``ValidationError`` if it could not be queued.
+    """
+    problem = models.Problem.objects.filter(pk=problem_id, deleted=False).first()
+    if problem is None:
+        return (False, ValidationError('Problem with code = {} not found'
+                                       .format(problem_id)))
+    testcase_ids = [str(testcase_id) for testcase_id in models.TestCase.objects.filter(
+        problem=problem).values_list('pk', flat=True)]
+    if len(testcase_ids) == 0:
+        return (False, ValidationError('Problem with code = {} has no testcases'
+                                       .format(problem_id)))
+
+    submissions = list(models.Submission.objects.filter(problem=problem)
+                       .values_list('pk', 'file_type'))
+    # Submissions which are yet to be rejudged from an earlier request are not queued again
+    queued = set(job.split('_')[2] for job in _rejudge_jobs(
+        [submission_id for submission_id, _ in submissions], prefixes=('sub_bulk_',)))
+    try:
+        for submission_id, file_type in submissions:
+            if str(submission_id) in queued:
+                continue
+            # The executable is compiled again by the job, in case the compilation script
+            # has changed. It is not removed here, as the submission may be running.
+            _queue_job('sub_bulk_{}_{}'.format(submission_id, uuid4().hex), problem,
+                       submission_id, file_type, testcase_ids, recompile=True)
+    # Catch any weird errors that might pop up while queueing
     except Exception as other_err:
         print_exc()
         return (False, ValidationError(str(other_err)))
@@ -354,20 +752,34 @@ def process_testcase(problem_id: str, test_type: str,
         return (True, None)
 
 
+def get_rejudge_progress(problem_id: str) -> int:
+    """
+    Function to get the progress of the bulk rejudge of a problem.
+
+    :param problem_id: Problem ID
+    :returns: Number of submissions of the problem which are yet to be rejudged
+    """
+    submission_ids = list(models.Submission.objects.filter(
+        problem=problem_id).values_list('pk', flat=True))
+    return len(_rejudge_jobs(submission_ids, prefixes=('sub_bulk_',)))
+
+
 def delete_testcase(testcase_id: str) -> STATUS_AND_OPT_ERROR_T:
     """
     Function to delete a :class:`~judge.models.TestCase` given its testcase ID.
     This will cascade delete in all the tables where this testcase appears.
 
-    .. warning::
-        This function does not rescore all the submissions and so score will not
-        change in response to the deleted testcase. Do not call this function once the
-        contest has started, it will lead to erroneous scores.
+    The submissions of the problem are then rescored without the testcase, as done by
+    :func:`rescore_problem`.
 
     :param testcase_id: the testcase ID
     :returns: A 2-tuple - 1st element indicating whether the deletion has succeeded, and
               2nd element providing a ``ValidationError`` if deletion is unsuccessful.
     """
+    testcase = models.TestCase.objects.filter(pk=testcase_id).first()
+    if testcase is None:
+        return (False, ValidationError('Testcase with ID = {} not found'.format(testcase_id)))
+
     inputfile_path = os.path.join(
         'content', 'testcase', 'inputfile_{}.txt'.format(testcase_id))
     outputfile_path = os.path.join(
@@ -375,16 +787,17 @@ def delete_testcase(testcase_id: str) -> STATUS_AND_OPT_ERROR_T:
     _check_and_remove(inputfile_path, outputfile_path)
 
     try:
-        models.TestCase.objects.filter(pk=testcase_id).delete()
+        testcase.delete()
     except Exception as other_err:
         print_exc()
         return (False, ValidationError(str(other_err)))
     else:
-        return (True, None)
+        bump_content_version(testcase.problem.contest_id)
+        return rescore_problem(testcase.problem_id)
 
 
 def process_submission(problem_id: str, participant_id: str, file_type: str,
-                       submission_file: InMemoryUploadedFile,
+                       submission_file: UploadedFile,
                        timestamp: str) -> STATUS_AND_OPT_ERROR_T:
     """
     Function to process a new :class:`~judge.models.Submission` for a problem by a participant.
@@ -417,48 +830,64 @@ def process_submission(problem_id: str, participant_id: str, file_type: str,
                                 .format(participant_id.lower())))
     participant = participant[0]
 
+    # The submission and its verdict rows are created together, and the job is queued for
+    # the submission watcher only after they are committed, so the watcher never sees a
+    # submission without its verdict rows
     try:
-        sub = problem.submission_set.create(participant=participant, file_type=file_type,
-                                            submission_file=submission_file, timestamp=timestamp)
-        sub.save()
+        with transaction.atomic():
+            sub = problem.submission_set.create(participant=participant, file_type=file_type,
+                                                submission_file=submission_file,
+                                                timestamp=timestamp)
+            testcase_ids = list(models.TestCase.objects.filter(problem=problem)
+                                .values_list('pk', flat=True))
+            models.SubmissionTestCase.objects.bulk_create(
+                [models.SubmissionTestCase(submission=sub, testcase_id=testcase_id,
+                                           verdict='R', memory_taken=0,
+                                           time_taken=timedelta(seconds=0))
+                 for testcase_id in testcase_ids],
+                batch_size=BULK_CREATE_BATCH_SIZE)
+            bump_scores_version(problem.contest_id)
+            transaction.on_commit(lambda: _queue_job('sub_run_{}'.format(sub.pk), problem,
+                                                     sub.pk, file_type, testcase_ids))
     # Catch any weird errors that might pop up during the creation
     except Exception as other_err:
         print_exc()
         return (False, ValidationError(str(other_err)))
+    else:
+        return (True, None)
 
-    testcases = models.TestCase.objects.filter(problem=problem)
 
-    if not os.path.exists(os.path.join('content', 'tmp')):
-        os.makedirs(os.path.join('content', 'tmp'))
+def _queue_job(job_name: str, problem: models.Problem, submission_id: str, file_type: str,
+               testcase_ids: List[str], recompile: bool = False):
+    """
+    Write a job file for the submission watcher, to run a submission on the given testcases.
+    The file is written under a temporary name and then renamed, so that the watcher never
+    reads a partial file. The job file is not changed by the run, whose verdicts are written
+    to a separate file, so an interrupted job is run again as is.
+
+    The job of the first run of a submission is named ``sub_run_ID``, and the jobs which
+    rejudge it on new testcases are named ``sub_rejudge_ID_TOKEN``. The jobs of a bulk
+    rejudge, see :func:`rejudge_problem`, are named ``sub_bulk_ID_TOKEN``.
+    """
+    tmp_dir = os.path.join('content', 'tmp')
+    if not os.path.exists(tmp_dir):
+        os.makedirs(tmp_dir)
+    job_path = os.path.join(tmp_dir, job_name + '.txt')
     # NB: File structure here
     # PROBLEM_ID
     # SUBMISSION_ID
     # FILE_FORMAT
     # TIME_LIMIT
     # MEMORY_LIMIT
+    # RECOMPILE
     # TESTCASE_1
     # TESTCASE_2
     # ....
-    with open(os.path.join('content', 'tmp', 'sub_run_' + str(sub.pk) + '.txt'), 'w') as f:
-        f.write('{}\n'.format(problem.pk))
-        f.write('{}\n'.format(sub.pk))
-        f.write('{}\n'.format(file_type))
-        f.write('{}\n'.format(int(problem.time_limit.total_seconds())))
-        f.write('{}\n'.format(problem.memory_limit))
-        for testcase in testcases:
-            f.write('{}\n'.format(testcase.pk))
-
-    try:
-        for testcase in testcases:
-            models.SubmissionTestCase.objects.create(submission=sub, testcase=testcase,
-                                                     verdict='R', memory_taken=0,
-                                                     time_taken=timedelta(seconds=0))
-    # Catch any weird errors that might pop up during the creation
-    except Exception as other_err:
-        print_exc()
-        return (False, ValidationError(other_err))
-    else:
-        return (True, None)
+    lines = [problem.pk, submission_id, file_type, int(problem.time_limit.total_seconds()),
+             problem.memory_limit, int(recompile)] + testcase_ids
+    with open(job_path + '.part', 'w') as f:
+        f.write(''.join('{}\n'.format(line) for line in lines))
+    os.replace(job_path + '.part', job_path)
 
 
 def update_poster_score(submission_id: str, new_score: int):
@@ -479,32 +908,196 @@ def update_poster_score(submission_id: str, new_score: int):
     submission = submission[0]
 
     try:
-        submission.final_score -= submission.poster_score
-        submission.poster_score = new_score
-        submission.final_score += submission.poster_score
-        submission.save()
+        with transaction.atomic():
+            update_submission_scores(submission.pk, submission.problem.contest,
+                                     poster_score=new_score)
     # Catch any weird errors that might pop up during the modification
     except Exception as other_err:
         return (False, ValidationError(str(other_err)))
+    invalidate_submission_status([submission.pk])
 
     highest_scoring_submission = models.Submission.objects.filter(
         problem=submission.problem.pk,
         participant=submission.participant.email).aggregate(Max('final_score'))['final_score__max']
 
     try:
-        ppf, _ = models.PersonProblemFinalScore.objects.get_or_create(
-            person=submission.participant, problem=submission.problem)
-        old_highscore = ppf.score
-        ppf.score = highest_scoring_submission
-        ppf.save()
+        with transaction.atomic():
+            ppf, _ = models.PersonProblemFinalScore.objects.select_for_update().get_or_create(
+                person=submission.participant, problem=submission.problem)
+            old_highscore = ppf.score
+            ppf.score = highest_scoring_submission
+            ppf.save()
+            if old_highscore != ppf.score:
+                # Update the leaderboard only if submission changed the final score
+                update_leaderboard(submission.problem.contest.pk,
+                                   submission.participant.email, ppf.score - old_highscore)
     # Catch any weird errors that might pop up during the creation
     except Exception as other_err:
         return (False, ValidationError(str(other_err)))
+    return (True, None)
+
+
+def update_linter_score(submission_id: str, new_score: float) -> STATUS_AND_OPT_ERROR_T:
+    """
+    Function to update the linter score for a submission once linting has finished.
+    The final score is recomputed with the late-submission penalty, and the leaderboard is
+    updated if the total score for the person-problem pair has changed.
+
+    :param submission_id: Submission ID of the submission
+    :param new_score: New linter score to be assigned
+    :returns: A 2-tuple - 1st element indicating whether the update has succeeded, and
+              2nd element providing a ``ValidationError`` if update is unsuccessful.
+    """
+    submission = models.Submission.objects.select_related('problem__contest').filter(
+        pk=submission_id)
+    if not submission.exists():
+        return (False,
+                ValidationError('Submission with ID = {} not found'
+                                .format(submission_id)))
+    submission = submission[0]
+    contest = submission.problem.contest
+
+    try:
+        with transaction.atomic():
+            update_submission_scores(submission.pk, contest, linter_score=new_score)
+            invalidate_submission_status([submission.pk])
+
+            ppf, _ = models.PersonProblemFinalScore.objects.select_for_update().get_or_create(
+                person_id=submission.participant_id, problem_id=submission.problem_id)
+            old_highscore = ppf.score
+            ppf.score = models.Submission.objects.filter(
+                problem=submission.problem_id,
+                participant=submission.participant_id).aggregate(
+                    Max('final_score'))['final_score__max']
+            ppf.save()
+            if old_highscore != ppf.score:
+                # Update the leaderboard only if submission changed the final score
+                update_leaderboard(contest.pk, submission.participant_id,
+                                   ppf.score - old_highscore)
+    # Catch any weird errors that might pop up during the modification
+    except Exception as other_err:
+        print_exc()
+        return (False, ValidationError(str(other_err)))
+    return (True, None)
+
+
+def update_submission_scores(submission_id: str, contest: models.Contest,
+                             **scores: float) -> float:
+    """
+    Function to update some of the judge, poster and linter scores of a submission, and
+    recompute its final score with the late-submission penalty. The final score is computed
+    by the database from the stored scores, so that a score updated concurrently, for
+    instance by a linter worker while the submission is rejudged, is never left out.
+    Call this function in a transaction along with the updates that depend on the scores.
+
+    :param submission_id: Submission ID of the submission
+    :param contest: Contest of the submission
+    :param scores: New values of ``judge_score``, ``poster_score`` or ``linter_score``
+    :returns: The new final score of the submission
+    """
+    submissions = models.Submission.objects.filter(pk=submission_id)
+    # The final score is updated separately, as an update reads the old values of the
+    # columns that it sets
+    submissions.update(**scores)
+    submissions.update(final_score=_final_score_expression(contest))
+    return submissions.values_list('final_score', flat=True).get()
+
+
+def _final_score_expression(contest: models.Contest) -> Greatest:
+    # A submission made in the k-th day after the soft deadline gets a multiplier
+    # of 1 - k * penalty, see get_penalty_multiplier. There is one bucket per such day.
+    soft_end, hard_end = contest.soft_end_datetime, contest.hard_end_datetime
+    penalty_days = -((soft_end - hard_end) // timedelta(days=1))
+    penalty_buckets = [When(timestamp__lte=soft_end, then=Value(1.0)),
+                       When(timestamp__gt=hard_end, then=Value(0.0))]
+    penalty_buckets += [When(timestamp__lte=soft_end + timedelta(days=day),
+                             then=Value(1.0 + (-day) * contest.penalty))
+                        for day in range(1, penalty_days + 1)]
+    penalty_multiplier = Case(*penalty_buckets, default=Value(0.0), output_field=FloatField())
+    return Greatest(
+        ExpressionWrapper((F('judge_score') + F('poster_score') +
+                           F('linter_score')) * penalty_multiplier,
+                          output_field=FloatField()),
+        Value(0.0))
+
+
+def _best_score_subquery() -> Subquery:
+    best_score = models.Submission.objects.filter(
+        problem=OuterRef('problem'), participant=OuterRef('person')).order_by().values(
+            'participant').annotate(best=Max('final_score')).values('best')
+    return Subquery(best_score, output_field=FloatField())
+
+
+def rescore_contest(contest_id: int) -> STATUS_AND_OPT_ERROR_T:
+    """
+    Function to recompute the final scores of all the submissions in a contest, for instance
+    after its deadlines or penalty have changed. The late-submission penalty is
+    evaluated in the database, and the :class:`~judge.models.PersonProblemFinalScore`
+    and the leaderboard are rebuilt from the new scores, so that the number of queries does
+    not depend on the number of submissions.
+
+    :param contest_id: Contest ID
+    :returns: A 2-tuple - 1st element indicating whether the rescoring has succeeded, and
+              2nd element providing a ``ValidationError`` if rescoring is unsuccessful.
+    """
+    contest = models.Contest.objects.filter(pk=contest_id)
+    if not contest.exists():
+        return (False, ValidationError('Contest with ID = {} not found'
+                                       .format(contest_id)))
+    contest = contest[0]
+
+    try:
+        with transaction.atomic():
+            models.Submission.objects.filter(problem__contest=contest).update(
+                final_score=_final_score_expression(contest), version=F('version') + 1)
+            models.PersonProblemFinalScore.objects.filter(problem__contest=contest).update(
+                score=_best_score_subquery())
+    # Catch any weird errors that might pop up during the modification
+    except Exception as other_err:
+        print_exc()
+        return (False, ValidationError(str(other_err)))
+
+    if not rebuild_leaderboard(contest.pk):
+        return (False, ValidationError('Leaderboard could not be rebuilt'))
+    return (True, None)
+
+
+def rescore_problem(problem_id: str) -> STATUS_AND_OPT_ERROR_T:
+    """
+    Function to recompute the judge scores of all the submissions of a problem from their
+    verdicts, for instance after a testcase has been deleted. The final scores, the
+    :class:`~judge.models.PersonProblemFinalScore` and the leaderboard are then recomputed
+    as done by :func:`rescore_contest`, with a fixed number of queries.
+
+    :param problem_id: Problem ID
+    :returns: A 2-tuple - 1st element indicating whether the rescoring has succeeded, and
+              2nd element providing a ``ValidationError`` if rescoring is unsuccessful.
+    """
+    problem = models.Problem.objects.select_related('contest').filter(pk=problem_id).first()
+    if problem is None:
+        return (False, ValidationError('Problem with code = {} not found'
+                                       .format(problem_id)))
+
+    passed = models.SubmissionTestCase.objects.filter(
+        submission=OuterRef('pk'), verdict='P').order_by().values(
+            'submission').annotate(passed=Count('pk')).values('passed')
+    submissions = models.Submission.objects.filter(problem=problem)
+
+    try:
+        with transaction.atomic():
+            submissions.update(judge_score=Coalesce(
+                Subquery(passed, output_field=IntegerField()), 0) * problem.max_score)
+            submissions.update(final_score=_final_score_expression(problem.contest),
+                               version=F('version') + 1)
+            models.PersonProblemFinalScore.objects.filter(problem=problem).update(
+                score=_best_score_subquery())
+    # Catch any weird errors that might pop up during the modification
+    except Exception as other_err:
+        print_exc()
+        return (False, ValidationError(str(other_err)))
 
-    if old_highscore != ppf.score:
-        # Update the leaderboard only if submission improved the final score
-        update_leaderboard(submission.problem.contest.pk,
-                           submission.participant.email)
+    if not rebuild_leaderboard(problem.contest_id):
+        return (False, ValidationError('Leaderboard could not be rebuilt'))
     return (True, None)
 
 
@@ -572,9 +1165,12 @@ def add_persons_to_contest(persons: List[str], contest_id: int,
     :returns: A 2-tuple - 1st element indicating whether the relation creation has succeeded, and
               2nd element providing a ``ValidationError`` if relation creation is unsuccessful.
     """
+    # Duplicates are removed, while keeping the order of the emails for the error messages
+    emails = list(dict.fromkeys(person_email.lower() for person_email in persons))
     try:
-        for person_email in persons:
-            models.Person.objects.get_or_create(email=person_email.lower())
+        models.Person.objects.bulk_create([models.Person(email=email) for email in emails],
+                                          batch_size=BULK_CREATE_BATCH_SIZE,
+                                          ignore_conflicts=True)
     # Catch any weird errors that might pop up during the creation
     except Exception as other_err:
         return (False, ValidationError(str(other_err)))
@@ -584,20 +1180,14 @@ def add_persons_to_contest(persons: List[str], contest_id: int,
         # Do not store participants for public contests
         return (True, None)
 
-    full_filter = Q()
-    for person_email in persons:
-        full_filter |= Q(email=person_email.lower())
-    person_list = models.Person.objects.filter(full_filter)
-    err_person_list_conflict = []
-    err_person_list_same = []
-    for person in person_list:
-        # Check that person is not already registered in the contest with other permission
-        cpset = models.ContestPerson.objects.filter(person=person, contest=contest)
-        if cpset.exists():
-            if cpset[0].role != permission:
-                err_person_list_conflict.append(person.email)
-            if cpset[0].role == permission:
-                err_person_list_same.append(person.email)
+    # All the persons in the contest are fetched, instead of filtering by the emails,
+    # so that the query does not grow with the number of emails
+    roles = dict(models.ContestPerson.objects.filter(contest=contest).values_list(
+        'person', 'role'))
+    err_person_list_conflict = [email for email in emails
+                                if email in roles and roles[email] != permission]
+    err_person_list_same = [email for email in emails
+                            if email in roles and roles[email] == permission]
     if len(err_person_list_conflict) or len(err_person_list_same):
         error_dict: Dict[str, List[str]] = {'emails': []}
         if len(err_person_list_conflict):
@@ -611,9 +1201,10 @@ def add_persons_to_contest(persons: List[str], contest_id: int,
         return (False, ValidationError(error_dict))
 
     try:
-        for person in person_list:
-            models.ContestPerson.objects.get_or_create(contest=contest,
-                                                       person=person, role=permission)
+        models.ContestPerson.objects.bulk_create(
+            [models.ContestPerson(contest=contest, person_id=email, role=permission)
+             for email in emails],
+            batch_size=BULK_CREATE_BATCH_SIZE, ignore_conflicts=True)
     # Catch any weird errors that might pop up during the creation
     except Exception as other_err:
         return (False, ValidationError(str(other_err)))
@@ -621,45 +1212,64 @@ def add_persons_to_contest(persons: List[str], contest_id: int,
         return (True, None)
 
 
+def get_personcontest_permissions(person_id: Optional[str],
+                                  contest_ids: Optional[List[int]] = None
+                                  ) -> Dict[int, Optional[bool]]:
+    """
+    Function to give the relation between a :class:`~judge.models.Person` and many
+    :class:`~judge.models.Contest` at once, using a single query.
+
+    :param person_id: Person ID
+    :param contest_ids: List of contest IDs. If ``None``, then all the contests are considered.
+    :returns: Dictionary with the contest ID as the key, and the relation as the value - if
+              participant, then ``False``, if poster, then ``True``, if neither, then ``None``.
+              Contests which are not found are left out.
+    """
+    curr = timezone.now()
+    # Contests being deleted are hidden from everyone
+    contests = models.Contest.objects.filter(deleted=False)
+    if contest_ids is not None:
+        contests = contests.filter(pk__in=contest_ids)
+    if person_id is not None:
+        person_id = person_id.lower()
+        contests = contests.annotate(
+            person_exists=Exists(models.Person.objects.filter(email=person_id)),
+            role=Subquery(models.ContestPerson.objects.filter(
+                contest=OuterRef('pk'), person=person_id).values('role')[:1]))
+    else:
+        contests = contests.annotate(person_exists=Value(False, output_field=BooleanField()),
+                                     role=Value(None, output_field=BooleanField()))
+
+    permissions: Dict[int, Optional[bool]] = {}
+    for contest_id, public, start_datetime, person_exists, role in contests.values_list(
+            'pk', 'public', 'start_datetime', 'person_exists', 'role'):
+        # The curr >= start_datetime is present because contests aren't visible
+        # to participants prior to the start
+        if person_id is not None and not person_exists:
+            permissions[contest_id] = None
+        elif role is not None:
+            # participant and curr < start_datetime -> None
+            if role is False and curr < start_datetime:
+                permissions[contest_id] = None
+            else:
+                permissions[contest_id] = role
+        elif public and curr >= start_datetime:
+            permissions[contest_id] = False
+        else:
+            permissions[contest_id] = None
+    return permissions
+
+
 def get_personcontest_permission(person_id: Optional[str], contest_id: int) -> Optional[bool]:
     """
     Function to give the relation between a :class:`~judge.models.Person` and a
-    :class:`~judge.models.Contest`.
+    :class:`~judge.models.Contest`. This dispatches to :func:`get_personcontest_permissions`.
 
     :param person_id: Person ID
     :param contest_id: Contest ID
     :returns: If participant, then ``False``, if poster, then ``True``, if neither, then ``None``
     """
-    curr = timezone.now()
-    contest = models.Contest.objects.filter(pk=contest_id)
-    if not contest.exists():
-        return None
-    contest = contest[0]
-
-    if person_id is None:
-        # The curr >= contest.start_datetime is present because contests aren't visible
-        # prior to the deadline
-        if contest.public and curr >= contest.start_datetime:
-            return False
-        else:
-            return None
-    else:
-        person = models.Person.objects.filter(email=person_id.lower())
-        if not person.exists():
-            return None
-        person = person[0]
-
-        cp = models.ContestPerson.objects.filter(person=person, contest=contest)
-        if cp.exists():
-            cp = cp[0]
-            # participant and curr >= contest.start_datetime -> None
-            if cp.role is False and curr < contest.start_datetime:
-                return None
-            return cp.role
-        else:
-            if contest.public and curr >= contest.start_datetime:
-                return False
-            return None
+    return get_personcontest_permissions(person_id, [contest_id]).get(contest_id)
 
 
 def delete_personcontest(person_id: str, contest_id: int) -> STATUS_AND_OPT_ERROR_T:
@@ -714,14 +1324,12 @@ def get_personproblem_permission(person_id: Optional[str], problem_id: str) -> O
     :param problem_id: Problem ID
     :returns: If participant, then ``False``, if poster, then ``True``, if neither, then ``None``
     """
-    problem = models.Problem.objects.filter(code=problem_id)
-    if not problem.exists():
-        return False
-    problem = problem[0]
-
-    if problem.contest is None:
+    problem = models.Problem.objects.filter(code=problem_id).values('contest', 'deleted').first()
+    if problem is None or problem['contest'] is None:
         return False
-    return get_personcontest_permission(person_id, problem.contest.pk)
+    if problem['deleted']:
+        return None
+    return get_personcontest_permission(person_id, problem['contest'])
 
 
 def get_posters(contest_id: int) -> Tuple[bool, Union[ValidationError, List[str]]]:
@@ -796,31 +1404,57 @@ def get_personcontest_score(person_id: str,
                                 .format(contest_id)))
     contest = contest[0]
 
-    problems = models.Problem.objects.filter(contest=contest)
-    full_filter = Q()
-    for problem in problems:
-        full_filter |= Q(person=person, problem=problem)
-
-    score = models.PersonProblemFinalScore.objects.filter(
-                                            full_filter).aggregate(Sum('score'))['score__sum']
+    # The total is maintained in ContestPersonScore as and when the problem scores change
+    score = models.ContestPersonScore.objects.filter(
+        contest=contest, person=person).values_list('score', flat=True).first()
     return (True, score)
 
 
-def get_submissions(problem_id: str,
-                    person_id: Optional[str]) -> Tuple[bool,
-                                                       Union[Dict[str, List[Any]],
-                                                             ValidationError]]:
+def get_penalty_multiplier(contest: models.Contest, timestamp: datetime) -> float:
+    """
+    Function to get the multiplier applied to the score of a submission made at
+    :attr:`timestamp` to a :class:`~judge.models.Contest`, given its deadlines and penalty.
+
+    :param contest: the contest
+    :param timestamp: Time at submission
+    :returns: ``1.0`` before the soft deadline, ``0.0`` after the hard deadline, and
+              ``1 - num_of_days * penalty`` in between, where `num_of_days` is the number
+              of (started) days after the soft deadline.
+    """
+    penalty_multiplier = 1.0
+    # If the submission crosses soft deadline
+    # Check if the submission has crossed the hard deadline
+    # If yes, penalty_multiplier = 0
+    # Else, penality_multiplier = 1 - num_of_days * penalty
+    remaining_time = contest.soft_end_datetime - timestamp
+    if timestamp > contest.soft_end_datetime:
+        if timestamp > contest.hard_end_datetime:
+            penalty_multiplier = 0.0
+        else:
+            penalty_multiplier += remaining_time.days * contest.penalty
+    return penalty_multiplier
+
+
+def get_submissions(problem_id: str, person_id: Optional[str], after: Optional[str] = None,
+                    limit: Optional[int] = None) -> Tuple[bool,
+                                                          Union[Dict[str, List[Any]],
+                                                                ValidationError]]:
     """
     Function to retrieve all submissions made by everyone or a specific person for this
-    problem.
+    problem. When retrieving the submissions of everyone, the persons can be paged through
+    in the order of their person IDs using :attr:`after` and :attr:`limit`.
 
     :param problem_id: Problem ID
     :param person_id: Person ID
+    :param after: If provided along with :attr:`person_id` as ``None``, then only the
+                  persons with person ID greater than :attr:`after` are considered
+    :param limit: If provided along with :attr:`person_id` as ``None``, then at most
+                  :attr:`limit` persons are considered
     :returns: A 2-tuple - 1st element indicating whether the retrieval has succeeded.
               If successful, and :attr:`person_id` is ``None``, then the list of submissions
-              pertaining to each person is placed in a dictionary, and if :attr:`person_id`
-              is provided, then the list of submissions pertaining to the specific person is
-              placed in a dictionary and returned.
+              pertaining to each person is placed in a dictionary ordered by the person IDs,
+              and if :attr:`person_id` is provided, then the list of submissions pertaining to
+              the specific person is placed in a dictionary and returned.
               If unsuccessful, then a ``ValidationError`` is additionally returned.
     """
     problem = models.Problem.objects.filter(code=problem_id)
@@ -830,9 +1464,20 @@ def get_submissions(problem_id: str,
                                 .format(problem_id)))
     problem = problem[0]
 
+    result: Dict[str, List[Any]] = {}
     if person_id is None:
-        submission_set = models.Submission.objects.filter(
-            problem=problem).order_by('participant')
+        submission_set = models.Submission.objects.filter(problem=problem)
+        if after is not None or limit is not None:
+            # The page of persons is found first, which only needs the index on
+            # the problem and the participant
+            persons = submission_set.order_by('participant').values_list(
+                'participant', flat=True).distinct()
+            if after is not None:
+                persons = persons.filter(participant__gt=after.lower())
+            if limit is not None:
+                persons = persons[:limit]
+            submission_set = submission_set.filter(participant__in=list(persons))
+        submission_set = submission_set.order_by('participant', 'timestamp')
     else:
         person = models.Person.objects.filter(email=person_id.lower())
         if not person.exists():
@@ -840,35 +1485,43 @@ def get_submissions(problem_id: str,
                     ValidationError('Person with email = {} not found'
                                     .format(person_id.lower())))
         person = person[0]
+        # Return a dict with a key as the person_id and value as an empty list
+        # if there are no submissions
+        result[person.email] = []
         submission_set = models.Submission.objects.filter(
-            problem=problem, participant=person)
-
-    # If submission_set is empty, then return an empty dictionary if no person_id is
-    # specified, otherwise return a dict with a key as the person_id and value as an
-    # empty list
-    if not submission_set.exists():
-        if person_id is None:
-            return (True, {})
-        else:
-            return (True, {person.email: []})
+            problem=problem, participant=person).order_by('timestamp')
 
     # The below code creates a dictionary with keys = person IDs and values
     # as a list of submissions made by the person (given by the key) for the problem
-    result = {}
-    curr_person = submission_set[0].participant.email
-    result[curr_person] = [submission_set[0]]
-    for i in range(1, len(submission_set)):
-        if submission_set[i].participant.email == curr_person:
-            result[curr_person].append(submission_set[i])
-        else:
-            curr_person = submission_set[i].participant.email
-            result[curr_person] = [submission_set[i]]
+    for submission in submission_set:
+        result.setdefault(submission.participant_id, []).append(submission)
     return (True, result)
 
 
+def _submission_status_key(submission_id: str, version: int) -> str:
+    return 'submission_status_{}_{}'.format(submission_id, version)
+
+
+def invalidate_submission_status(submission_ids: List[str]):
+    """
+    Function to increment the versions of submissions, which also makes their cached
+    statuses stale. Call this function whenever the verdicts or scores of a submission
+    change. To change all the submissions of a problem or a contest, increment ``version``
+    in the same set-based update instead.
+
+    :param submission_ids: List of submission IDs
+    """
+    for start in range(0, len(submission_ids), BULK_CREATE_BATCH_SIZE):
+        models.Submission.objects.filter(
+            pk__in=submission_ids[start:start + BULK_CREATE_BATCH_SIZE]).update(
+                version=F('version') + 1)
+
+
 def get_submission_status(submission_id: str):
     """
     Function to get the current status of the submission given its submission ID.
+    Once all the testcases of the submission are judged, the status is cached under the
+    version of the submission, until :func:`invalidate_submission_status` is called for it.
 
     :param submission_d: Submission ID
     :returns: A 2-tuple - 1st element indicating whether the retrieval has succeeded.
@@ -881,23 +1534,30 @@ def get_submission_status(submission_id: str):
               the file type of submission.
               If unsuccessful, a ``ValidationError`` is additionally returned.
     """
-    submission = models.Submission.objects.filter(pk=submission_id)
-    if not submission.exists():
+    submission = models.Submission.objects.filter(pk=submission_id).first()
+    if submission is None:
         return (False,
                 ValidationError('Submission with primary key = {} not found'
                                 .format(submission_id)))
-    submission = submission[0]
-    testcases = models.TestCase.objects.filter(problem=submission.problem)
+    cache_key = _submission_status_key(submission_id, submission.version)
+    status = cache.get(cache_key)
+    if status is not None:
+        return (True, status)
 
     verdict_dict = {}
-    for testcase in testcases:
-        st = models.SubmissionTestCase.objects.get(submission=submission_id, testcase=testcase)
-        verdict_dict[testcase.pk] = (st.get_verdict_display, st.time_taken,
-                                     st.memory_taken, testcase.public, st.message)
+    judged = True
+    for st in models.SubmissionTestCase.objects.filter(
+            submission=submission_id).select_related('testcase'):
+        verdict_dict[st.testcase_id] = (st.get_verdict_display(), st.time_taken,
+                                        st.memory_taken, st.testcase.public, st.message)
+        judged = judged and st.verdict != 'R'
 
     score_tuple = (submission.judge_score, submission.poster_score, submission.linter_score,
                    submission.final_score, submission.timestamp, submission.file_type)
-    return (True, (verdict_dict, score_tuple))
+    status = (verdict_dict, score_tuple)
+    if judged and len(verdict_dict) > 0:
+        cache.set(cache_key, status, SUBMISSION_STATUS_CACHE_TIMEOUT)
+    return (True, status)
 
 
 def get_leaderboard(contest_id: int) -> Tuple[bool, Union[str, List[List[Union[str, float]]]]]:
@@ -907,58 +1567,340 @@ def get_leaderboard(contest_id: int) -> Tuple[bool, Union[str, List[List[Union[s
     :param contest_id: Contest ID
     :returns: A 2-tuple - 1st element indicating whether leaderboard has been initialized or not.
               If initialized, a list of 2-length lists is returned ordered by decreasing
-              scores. The first element is the rank, and the second element is the score.
+              scores. The first element is the person ID, and the second element is the score.
               If uninitialized, a suitable message is provided
     """
-    leaderboard_path = os.path.join('content', 'contests', str(contest_id) + '.lb')
-    if not os.path.exists(leaderboard_path):
+    entries = models.ContestPersonScore.objects.filter(contest=contest_id).order_by(
+        '-score', 'person').values_list('person', 'score')
+    data = [list(entry) for entry in entries]
+    if len(data) == 0:
         return (False, 'Leaderboard not yet initialized for this contest.')
-
-    with open(leaderboard_path, 'rb') as f:
-        data = pickle.load(f)
     return (True, data)
 
 
-def update_leaderboard(contest_id: int, person_id: str) -> bool:
+def _rank_leaderboard_entries(contest_id: int, entries: List[Tuple[str, float]], offset: int,
+                              dense: bool) -> List[List[Union[int, str, float]]]:
+    # Only the rank of the first entry needs a query, the ranks of the rest of the entries
+    # follow from the order of the entries
+    if len(entries) == 0:
+        return []
+    higher_scores = models.ContestPersonScore.objects.filter(contest=contest_id,
+                                                             score__gt=entries[0][1])
+    if dense:
+        rank = higher_scores.values('score').distinct().count() + 1
+    else:
+        rank = higher_scores.count() + 1
+    ranked_entries: List[List[Union[int, str, float]]] = []
+    prev_score = entries[0][1]
+    for i, (person, score) in enumerate(entries):
+        if score != prev_score:
+            rank = rank + 1 if dense else offset + i + 1
+            prev_score = score
+        ranked_entries.append([rank, person, score])
+    return ranked_entries
+
+
+def get_leaderboard_size(contest_id: int) -> int:
+    """
+    Function to get the number of persons on the leaderboard for a contest.
+
+    :param contest_id: Contest ID
+    :returns: The number of persons on the leaderboard
+    """
+    return models.ContestPersonScore.objects.filter(contest=contest_id).count()
+
+
+def get_leaderboard_window(contest_id: int, offset: int, limit: int, dense: bool = False
+                           ) -> Tuple[bool, Union[str, List[List[Union[int, str, float]]]]]:
+    """
+    Function to get a window of the leaderboard for a contest given its contest ID, along with
+    the ranks of the persons in the window. Persons with the same score get the same rank.
+    The top-K persons are obtained with :attr:`offset` as 0 and :attr:`limit` as K.
+
+    :param contest_id: Contest ID
+    :param offset: Number of persons on the leaderboard before the window
+    :param limit: Maximum number of persons in the window
+    :param dense: If ``True``, then dense ranking ("1223") is used, otherwise standard
+                  competition ranking ("1224") is used.
+    :returns: A 2-tuple - 1st element indicating whether leaderboard has been initialized or not.
+              If initialized, a list of 3-length lists is returned ordered by decreasing
+              scores. The elements are the rank, the person ID and the score.
+              If uninitialized, a suitable message is provided
+    """
+    entries = list(models.ContestPersonScore.objects.filter(contest=contest_id).order_by(
+        '-score', 'person').values_list('person', 'score')[offset:offset + limit])
+    if len(entries) == 0 and offset == 0:
+        return (False, 'Leaderboard not yet initialized for this contest.')
+    return (True, _rank_leaderboard_entries(contest_id, entries, offset, dense))
+
+
+def get_leaderboard_rank(contest_id: int, person_id: str, neighbours: int = 2,
+                         dense: bool = False) -> Tuple[bool, Union[str, Tuple[
+                             int, List[List[Union[int, str, float]]]]]]:
+    """
+    Function to get the rank of a person on the leaderboard for a contest, along with the
+    persons placed right above and below them.
+
+    :param contest_id: Contest ID
+    :param person_id: Person ID
+    :param neighbours: Number of persons to include above and below the person
+    :param dense: If ``True``, then dense ranking is used, otherwise standard
+                  competition ranking is used.
+    :returns: A 2-tuple - 1st element indicating whether the person is on the leaderboard.
+              If so, a 2-tuple of the rank of the person and the window of the leaderboard
+              (see :func:`get_leaderboard_window`) around the person is returned.
+              If not, a suitable message is provided
+    """
+    person_id = person_id.lower()
+    entries = models.ContestPersonScore.objects.filter(contest=contest_id)
+    score = entries.filter(person=person_id).values_list('score', flat=True).first()
+    if score is None:
+        return (False, '{} is not on the leaderboard for this contest.'.format(person_id))
+
+    # Position of the person on the leaderboard, as per the order in get_leaderboard_window
+    position = entries.filter(Q(score__gt=score) | Q(score=score, person__lt=person_id)).count()
+    offset = max(0, position - neighbours)
+    window = _rank_leaderboard_entries(
+        contest_id, list(entries.order_by('-score', 'person').values_list(
+            'person', 'score')[offset:position + neighbours + 1]), offset, dense)
+    return (True, (int(window[position - offset][0]), window))
+
+
+def get_leaderboard_changes(contest_id: int, since_version: int
+                            ) -> Tuple[int, List[List[Union[str, float]]]]:
+    """
+    Function to get the scores on the leaderboard of a contest that have changed after
+    a given scores version of the contest.
+
+    :param contest_id: Contest ID
+    :param since_version: Scores version of the contest after which the changes are needed
+    :returns: A 2-tuple - 1st element is the current scores version of the contest, and
+              2nd element is a list of 2-length lists of the person ID and the new score
+              of the persons whose scores have changed.
+    """
+    version = models.Contest.objects.filter(pk=contest_id).values_list(
+        'scores_version', flat=True).first()
+    changes = models.ContestPersonScore.objects.filter(
+        contest=contest_id, version__gt=since_version).values_list('person', 'score')
+    return (version or 0, [list(change) for change in changes])
+
+
+def get_submission_verdicts(submission_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Function to get the scores and the verdicts for the testcases of many submissions at once.
+
+    :param submission_ids: List of submission IDs
+    :returns: A dictionary whose key is the submission ID, and value is a dictionary with keys
+              ``version``, ``judge_score``, ``poster_score``, ``linter_score``,
+              ``final_score`` and ``verdicts``. ``verdicts`` maps the testcase ID to the
+              verdict of the testcase. Submissions which are not found are left out.
+    """
+    verdict_names = dict(models.SubmissionTestCase.VERDICT)
+    result: Dict[str, Dict[str, Any]] = {}
+    for submission in models.Submission.objects.filter(pk__in=submission_ids).values(
+            'pk', 'version', 'judge_score', 'poster_score', 'linter_score', 'final_score'):
+        submission_id = str(submission.pop('pk'))
+        submission['verdicts'] = {}
+        result[submission_id] = submission
+    for submission_id, testcase_id, verdict in models.SubmissionTestCase.objects.filter(
+            submission__in=submission_ids).values_list('submission', 'testcase', 'verdict'):
+        result[str(submission_id)]['verdicts'][str(testcase_id)] = verdict_names[verdict]
+    return result
+
+
+def update_leaderboard(contest_id: int, person_id: str, delta: Optional[float] = None) -> bool:
     """
     Function to update the leaderboard for a person-contest pair given their IDs.
 
     .. note::
-        Only call this function when some submission for some problem of the contest
-        has scored more than its previous submission.
-        Remember to call this function whenever
-        :class:`~judge.models.PersonProblemFinalScore` is updated.
+        Call this function whenever a :class:`~judge.models.PersonProblemFinalScore` of the
+        person for some problem of the contest changes, preferably in the same transaction,
+        and pass the change as ``delta``. The change is the new score less the old score,
+        so it is negative when the score decreases, for instance when submissions are
+        rescored with a penalty or rejudged, when a testcase that they passed is deleted,
+        or when a poster score is lowered.
 
     :param contest_id: Contest ID
     :param person_id: Person ID
+    :param delta: Signed change in the :class:`~judge.models.PersonProblemFinalScore` of the
+                  person for some problem of the contest, which is added to the total of
+                  the person. If ``None``, then the total is recomputed from all the
+                  :class:`~judge.models.PersonProblemFinalScore` of the person.
     :returns: If update is successful, then ``True``. If unsuccessful, then ``False``.
     """
-    os.makedirs(os.path.join('content', 'contests'), exist_ok=True)
-    pickle_path = os.path.join('content', 'contests', str(contest_id) + '.lb')
+    person_id = person_id.lower()
+    if delta is None:
+        # The total is computed and written by the same statement, so that concurrent updates
+        # for the same person always leave the latest total behind
+        total_score = models.PersonProblemFinalScore.objects.filter(
+            person=OuterRef('person'), problem__contest=OuterRef('contest')).order_by().values(
+                'person').annotate(total=Sum('score')).values('total')
+        new_score = Coalesce(Subquery(total_score, output_field=FloatField()), 0.0)
+    else:
+        # The change is applied in the database, so concurrent deltas do not overwrite
+        # each other
+        new_score = F('score') + delta
+    try:
+        with transaction.atomic():
+            models.ContestPersonScore.objects.get_or_create(contest_id=contest_id,
+                                                            person_id=person_id)
+            bump_scores_version(contest_id)
+            # The version of the change lets the event streams send only the changed scores
+            models.ContestPersonScore.objects.filter(
+                contest=contest_id, person=person_id).update(
+                    score=new_score, version=Subquery(models.Contest.objects.filter(
+                        pk=contest_id).values('scores_version')))
+    # Catch any weird errors that might pop up during the modification
+    except Exception:
+        print_exc()
+        return False
+    else:
+        return True
 
-    status, score = get_personcontest_score(person_id, contest_id)
 
-    if status:
-        if not os.path.exists(pickle_path):
-            with open(pickle_path, 'wb') as f:
-                data = [[person_id, score]]
-                pickle.dump(data, f)
-            return True
-        else:
-            with open(pickle_path, 'rb') as f:
-                data = pickle.load(f)
-            with open(pickle_path, 'wb') as f:
-                for i in range(len(data)):
-                    if data[i][0] == person_id:
-                        data[i][1] = score
-                        break
-                else:
-                    data.append([person_id, score])
-                data = sorted(data, key=lambda x: x[1], reverse=True)
-                pickle.dump(data, f)
-            return True
-    else:
+def rebuild_leaderboard(contest_id: Optional[int] = None) -> bool:
+    """
+    Function to rebuild the leaderboard of a contest from scratch, using the
+    :class:`~judge.models.PersonProblemFinalScore` of all the persons in the contest.
+
+    :param contest_id: Contest ID. If ``None``, then the leaderboards of all the contests
+                       are rebuilt.
+    :returns: If rebuild is successful, then ``True``. If unsuccessful, then ``False``.
+    """
+    leaderboards = models.ContestPersonScore.objects.all()
+    problem_scores = models.PersonProblemFinalScore.objects.all()
+    if contest_id is not None:
+        leaderboards = leaderboards.filter(contest=contest_id)
+        problem_scores = problem_scores.filter(problem__contest=contest_id)
+    totals = problem_scores.values('problem__contest', 'person').annotate(
+        total=Sum('score')).order_by()
+    try:
+        with transaction.atomic():
+            leaderboards.delete()
+            models.ContestPersonScore.objects.bulk_create(
+                [models.ContestPersonScore(contest_id=entry['problem__contest'],
+                                           person_id=entry['person'], score=entry['total'])
+                 for entry in totals.iterator()], batch_size=1000)
+            contests = models.Contest.objects.all()
+            if contest_id is not None:
+                contests = contests.filter(pk=contest_id)
+            contests.update(scores_version=F('scores_version') + 1)
+            leaderboards.update(version=Subquery(models.Contest.objects.filter(
+                pk=OuterRef('contest')).values('scores_version')))
+    # Catch any weird errors that might pop up during the modification
+    except Exception:
+        print_exc()
         return False
+    else:
+        return True
+
+
+def bump_scores_version(contest_id: int):
+    """
+    Function to mark the scores of a contest as changed, so that the cached views of the
+    scores (such as the score matrix) are recomputed.
+
+    :param contest_id: Contest ID
+    """
+    models.Contest.objects.filter(pk=contest_id).update(scores_version=F('scores_version') + 1)
+
+
+def bump_content_version(contest_id: int):
+    """
+    Function to mark the details, problems or test cases of a contest as changed, so that
+    the cached pages of the contest and its problems are recomputed.
+
+    :param contest_id: Contest ID
+    """
+    models.Contest.objects.filter(pk=contest_id).update(
+        content_version=F('content_version') + 1)
+
+
+def get_contest_list_version() -> str:
+    """
+    Function to get the version of the list of contests, under which the list is cached.
+
+    :returns: A token which changes whenever a contest is created, changed or deleted
+    """
+    version = cache.get(CONTEST_LIST_VERSION_KEY)
+    if version is None:
+        # A new token, and not a counter, so that an evicted version is never reused
+        cache.add(CONTEST_LIST_VERSION_KEY, uuid4().hex, None)
+        version = cache.get(CONTEST_LIST_VERSION_KEY)
+    return version
+
+
+def bump_contest_list_version():
+    """
+    Function to mark the list of contests as changed.
+    """
+    cache.set(CONTEST_LIST_VERSION_KEY, uuid4().hex, None)
+
+
+def _compute_score_matrix(contest_id: int) -> Dict[str, Any]:
+    problems = list(models.Problem.objects.filter(contest=contest_id, deleted=False).order_by(
+        'code').values_list('code', flat=True))
+
+    # Best score, number of attempts and time of the earliest best submission are obtained
+    # for all person-problem pairs together
+    best_score = models.PersonProblemFinalScore.objects.filter(
+        person=OuterRef('participant'), problem=OuterRef('problem')).values('score')
+    best_time = models.Submission.objects.filter(
+        participant=OuterRef('participant'), problem=OuterRef('problem'),
+        final_score=OuterRef('best_score')).order_by('timestamp').values('timestamp')[:1]
+    cells = models.Submission.objects.filter(problem__contest=contest_id).values(
+        'participant', 'problem').order_by().annotate(
+            attempts=Count('pk'),
+            best_score=Subquery(best_score, output_field=FloatField())).annotate(
+                best_time=Subquery(best_time))
+    person_cells: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for cell in cells:
+        person_cells.setdefault(cell['participant'], {})[cell['problem']] = {
+            'score': cell['best_score'],
+            'attempts': cell['attempts'],
+            'best_time': cell['best_time'] if cell['best_score'] is not None else None,
+        }
+
+    entries = list(models.ContestPersonScore.objects.filter(contest=contest_id).order_by(
+        '-score', 'person').values_list('person', 'score'))
+    ranked_persons = {entry[0] for entry in entries}
+    # Persons whose submissions are yet to be scored are placed at the end
+    entries.extend((person, 0.0) for person in sorted(person_cells.keys() - ranked_persons))
+    rows = [[rank, person, score,
+             [person_cells.get(str(person), {}).get(code) for code in problems]]
+            for rank, person, score in _rank_leaderboard_entries(contest_id, entries, 0, False)]
+    return {'problems': problems, 'rows': rows}
+
+
+def get_score_matrix(contest_id: int) -> Tuple[bool, Union[ValidationError, Dict[str, Any]]]:
+    """
+    Function to get the score matrix of a contest, which has the best score, the number of
+    attempts and the time of the best submission of every participant for every problem.
+    The matrix is computed with a fixed number of queries and is cached until the
+    scores of the contest change.
+
+    :param contest_id: Contest ID
+    :returns: A 2-tuple - 1st element indicating whether the retrieval has succeeded.
+              If successful, a dictionary is returned, with ``problems`` being the list of
+              problem codes and ``rows`` being a list of rows ordered by rank.
+              Each row is a list of the rank, the person ID, the total score and a list of
+              cells, one for each problem. A cell is ``None`` if the person has not attempted
+              the problem, otherwise a dictionary with keys ``score``, ``attempts`` and
+              ``best_time``.
+              If unsuccessful, a ``ValidationError`` is additionally returned.
+    """
+    version = models.Contest.objects.filter(pk=contest_id).values_list(
+        'scores_version', flat=True).first()
+    if version is None:
+        return (False,
+                ValidationError('Contest with ID = {} not found'.format(contest_id)))
+
+    cache_key = 'score_matrix_{}_{}'.format(contest_id, version)
+    matrix = cache.get(cache_key)
+    if matrix is None:
+        matrix = _compute_score_matrix(contest_id)
+        cache.set(cache_key, matrix, SCORE_MATRIX_CACHE_TIMEOUT)
+    return (True, matrix)
 
 
 def process_comment(problem_id: str, person_id: str, commenter_id: str,
@@ -1014,22 +1956,80 @@ def get_comments(problem_id: str,
               the person who commented, the timestamp and the comment content, sorted in
               chronological order.
     """
-    comments = models.Comment.objects.filter(problem=problem_id,
-                                             person=person_id.lower()).order_by('timestamp')
+    comments = models.Comment.objects.filter(
+        problem=problem_id, person=person_id.lower()).select_related(
+            'commenter').order_by('timestamp')
     result = [(comment.commenter, comment.timestamp, comment.comment)
               for comment in comments]
     return result
 
 
-def get_csv(contest_id: int) -> Tuple[bool, Union[ValidationError, StringIO]]:
+def get_comments_of_persons(problem_id: str,
+                            person_ids: List[str]) -> Dict[str, List[Tuple[Any, Any, Any]]]:
     """
-    Function to get the CSV (in string form) of the current scores of
-    all participants in a contest given its contest ID.
+    Function to get the private comments on the problem for many persons at once.
+
+    :param problem_id: Problem ID
+    :param person_ids: List of person IDs
+    :returns: Dictionary with the person ID as the key, and the list of comments for the
+              person (as given by :func:`get_comments`) as the value. Every person in
+              :attr:`person_ids` is present in the dictionary.
+    """
+    person_ids = [person_id.lower() for person_id in person_ids]
+    result: Dict[str, List[Tuple[Any, Any, Any]]] = {person_id: [] for person_id in person_ids}
+    comments = models.Comment.objects.filter(
+        problem=problem_id, person__in=person_ids).select_related(
+            'commenter').order_by('timestamp')
+    for comment in comments:
+        result[comment.person_id].append((comment.commenter, comment.timestamp,
+                                          comment.comment))
+    return result
+
+
+class _EchoBuffer:
+    # The CSV writer writes a row to this and returns what is written, so that
+    # the rows can be yielded one at a time
+    def write(self, value: str) -> str:
+        return value
+
+
+def _generate_csv(contest_id: int, per_problem: bool) -> Iterator[str]:
+    writer = csvwriter(_EchoBuffer())
+    if not per_problem:
+        yield writer.writerow(['Email', 'Score'])
+        # The totals are maintained in ContestPersonScore, so no aggregation is needed here
+        for row in models.ContestPersonScore.objects.filter(contest=contest_id).order_by(
+                'person').values_list('person', 'score').iterator():
+            yield writer.writerow(row)
+        return
+
+    problems = list(models.Problem.objects.filter(contest=contest_id, deleted=False).order_by(
+        'code').values_list('code', flat=True))
+    yield writer.writerow(['Email', 'Score'] + problems)
+    # The scores of all the problems are pivoted into columns by a single GROUP BY
+    columns = {'problem_{}'.format(i): Sum(Case(When(problem=code, then='score')))
+               for i, code in enumerate(problems)}
+    rows = models.PersonProblemFinalScore.objects.filter(problem__contest=contest_id).values(
+        'person').annotate(total=Sum('score'), **columns).order_by('person').values_list(
+            'person', 'total', *columns.keys())
+    for row in rows.iterator():
+        yield writer.writerow(row)
+
+
+def get_csv(contest_id: int,
+            per_problem: bool = False) -> Tuple[bool, Union[ValidationError, Iterator[str]]]:
+    """
+    Function to get the CSV of the current scores of all participants in a contest
+    given its contest ID. The CSV is generated one row at a time, so that it can be
+    streamed without holding all the scores in memory.
 
     :param contest_id: Contest ID
+    :param per_problem: If ``True``, then the score of every problem is added as a column,
+                        with the problem code as the header. Problems which have not been
+                        attempted by a participant have empty values.
     :returns: A 2-tuple - 1st element indicating whether the retrieval has succeeded, and
-              2nd element providing a ``ValidationError`` if processing is unsuccessful or a
-              ``StringIO`` object if successful.
+              2nd element providing a ``ValidationError`` if processing is unsuccessful or an
+              iterator over the lines of the CSV if successful.
     """
     contest = models.Contest.objects.filter(pk=contest_id)
     # In this case, we return a non-field ValidationError to state that the
@@ -1039,53 +2039,4 @@ def get_csv(contest_id: int) -> Tuple[bool, Union[ValidationError, StringIO]]:
     if not contest.exists():
         return (False,
                 ValidationError('Contest with primary key = {} not found'.format(contest_id)))
-    contest = contest[0]
-
-    problems = models.Problem.objects.filter(contest=contest)
-
-    csvstring = StringIO()
-    writer = csvwriter(csvstring)
-    writer.writerow(['Email', 'Score'])
-
-    if problems.exists():
-        # For every problem, get the final scores given for any participant
-        # who has attempted it
-        full_filter = Q()
-        for problem in problems:
-            full_filter |= Q(problem=problem)
-
-        submissions = models.PersonProblemFinalScore.objects.filter(full_filter)
-
-        if submissions.exists():
-            # Now sort all the person-problem-scores by 'person' and 'problem'
-            # This will create scores like:
-            # [('p1', 3 -> (score corresponding to problem2)),
-            #  ('p1', 2 -> (score corresponding to problem4)),
-            #  ('p2', 5 -> (score corresponding to problem3)),
-            #  ('p2', 0 -> (score corresponding to problem1)) ... ]
-            # We do not need to save exactly which problem the score corresponds to
-            # we only need to know scores on all problems by a participant
-            submissions.order_by('person', 'problem')
-            scores = [(submission.person, submission.score)
-                      for submission in submissions]
-
-            # Here we aggregate the previous list.
-            # We simply iterate over scores and for each participant,
-            # we sum up how much has he scored in all the problems.
-            # To do this we exploit the fact that list is already sorted.
-            # In the above case after aggregating we'll write
-            # 'p1', 5
-            # 'p2', 5 etc. in csvstring
-            curr_person = scores[0][0]
-            sum_scores = 0
-            for score in scores:
-                if curr_person == score[0]:
-                    sum_scores += score[1]
-                else:
-                    writer.writerow([curr_person, sum_scores])
-                    curr_person = score[0]
-                    sum_scores = score[1]
-            writer.writerow([curr_person, sum_scores])
-
-    csvstring.seek(0)
-    return (True, csvstring)
+    return (True, _generate_csv(contest_id, per_problem))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from judge import handler
+
+
+class Command(BaseCommand):
+    help = 'Delete the contests and problems which have been marked for deletion'
+
+    def handle(self, *args, **options):
+        handler.purge_deleted(log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS('Deleted all the marked contests and problems'))
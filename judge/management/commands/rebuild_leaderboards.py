@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from judge import handler
+
+
+class Command(BaseCommand):
+    help = 'Recompute the leaderboard totals of contests from the problem scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contest', type=int, default=None,
+                            help='ID of the contest to rebuild, all contests by default')
+
+    def handle(self, *args, **options):
+        if not handler.rebuild_leaderboard(options['contest']):
+            raise CommandError('Rebuilding the leaderboards failed')
+        self.stdout.write(self.style.SUCCESS('Rebuilt the leaderboards'))
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.6 on 2026-10-19 05:04
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='id',
+            field=models.CharField(default=uuid.uuid4, max_length=36, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='id',
+            field=models.CharField(default=uuid.uuid4, max_length=36, primary_key=True, serialize=False),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['problem', 'participant'], name='judge_submi_problem_654227_idx'),
+        ),
+    ]
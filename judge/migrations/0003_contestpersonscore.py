@@ -0,0 +1,43 @@
+# Generated by Django 3.1.6 on 2026-10-19 05:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_leaderboards(apps, schema_editor):
+    # Leaderboards used to be pickled in content/contests/; rebuild them from the final scores
+    PersonProblemFinalScore = apps.get_model('judge', 'PersonProblemFinalScore')
+    ContestPersonScore = apps.get_model('judge', 'ContestPersonScore')
+    totals = PersonProblemFinalScore.objects.exclude(problem__contest=None).values(
+        'problem__contest', 'person').annotate(total=models.Sum('score'))
+    ContestPersonScore.objects.bulk_create(
+        [ContestPersonScore(contest_id=entry['problem__contest'], person_id=entry['person'],
+                            score=entry['total']) for entry in totals])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0002_submission_problem_participant_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContestPersonScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0.0)),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='judge.contest')),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='judge.person')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='contestpersonscore',
+            index=models.Index(fields=['contest', '-score'], name='judge_conte_contest_4b04c1_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='contestpersonscore',
+            unique_together={('contest', 'person')},
+        ),
+        migrations.RunPython(populate_leaderboards, migrations.RunPython.noop),
+    ]
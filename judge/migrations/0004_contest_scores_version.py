@@ -0,0 +1,18 @@
+# Generated by Django 3.1.6 on 2026-10-19 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0003_contestpersonscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='scores_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.6 on 2026-10-19 05:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0004_contest_scores_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contestpersonscore',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='contestpersonscore',
+            index=models.Index(fields=['contest', 'version'], name='judge_conte_contest_b003b2_idx'),
+        ),
+    ]
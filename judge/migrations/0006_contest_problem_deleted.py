@@ -0,0 +1,23 @@
+# Generated by Django 3.1.6 on 2026-10-19 05:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0005_contestpersonscore_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='deleted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='problem',
+            name='deleted',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.1.6 on 2026-10-19 05:26
+
+from django.db import migrations, models
+
+# Same as TESTCASE_PREVIEW_SIZE and TESTCASE_PREVIEW_LINES in judge.handler, at the time
+# of this migration
+PREVIEW_SIZE = 1000
+PREVIEW_LINES = 20
+
+
+def _file_preview(field_file):
+    try:
+        with field_file.open('rb') as f:
+            head = f.read(PREVIEW_SIZE + 1)
+    except (OSError, ValueError):
+        return ''
+    lines = head[:PREVIEW_SIZE].split(b'\n')
+    truncated = len(head) > PREVIEW_SIZE or len(lines) > PREVIEW_LINES
+    preview = b'\n'.join(lines[:PREVIEW_LINES]).decode('utf-8', errors='replace')
+    return preview + '\n...' if truncated else preview
+
+
+def compute_previews(apps, schema_editor):
+    TestCase = apps.get_model('judge', 'TestCase')
+    for testcase in TestCase.objects.all().iterator():
+        testcase.input_preview = _file_preview(testcase.inputfile)
+        testcase.output_preview = _file_preview(testcase.outputfile)
+        testcase.save(update_fields=['input_preview', 'output_preview'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0006_contest_problem_deleted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcase',
+            name='input_preview',
+            field=models.TextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='output_preview',
+            field=models.TextField(default=''),
+        ),
+        migrations.RunPython(compute_previews, migrations.RunPython.noop),
+    ]
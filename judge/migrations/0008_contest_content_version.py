@@ -0,0 +1,18 @@
+# Generated by Django 3.1.6 on 2026-10-19 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0007_testcase_previews'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='content_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.6 on 2026-10-19 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0008_contest_content_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.1.6 on 2026-10-19 05:36
+
+from hashlib import sha256
+
+from django.db import migrations, models
+
+
+def _file_hash(field_file):
+    content_hash = sha256()
+    try:
+        with field_file.open('rb') as f:
+            for chunk in f.chunks():
+                content_hash.update(chunk)
+    except (OSError, ValueError):
+        return ''
+    return content_hash.hexdigest()
+
+
+def compute_hashes(apps, schema_editor):
+    TestCase = apps.get_model('judge', 'TestCase')
+    for testcase in TestCase.objects.all().iterator():
+        testcase.input_hash = _file_hash(testcase.inputfile)
+        testcase.output_hash = _file_hash(testcase.outputfile)
+        testcase.save(update_fields=['input_hash', 'output_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0009_submission_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcase',
+            name='input_hash',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='output_hash',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.RunPython(compute_hashes, migrations.RunPython.noop),
+    ]
@@ -67,6 +67,15 @@ class Contest(models.Model):
     enable_poster_score = models.BooleanField(default=True)
     """Enable poster scoring"""
 
+    scores_version = models.PositiveIntegerField(default=0)
+    """Incremented whenever the submissions or scores of the contest change"""
+
+    content_version = models.PositiveIntegerField(default=0)
+    """Incremented whenever the contest, its problems or their test cases change"""
+
+    deleted = models.BooleanField(default=False)
+    """Is the contest being deleted? Such contests are hidden until they are deleted."""
+
     def __str__(self):
         return self.name
 
@@ -126,6 +135,9 @@ class Problem(models.Model):
         default='./default/test_script.sh')
     """Problem test script"""
 
+    deleted = models.BooleanField(default=False)
+    """Is the problem being deleted? Such problems are hidden until they are deleted."""
+
     def __str__(self):
         return self.code
 
@@ -190,6 +202,13 @@ class Submission(models.Model):
     final_score = models.FloatField(default=0.0)
     """Final score"""
 
+    version = models.PositiveIntegerField(default=0)
+    """Incremented whenever the verdicts or scores of the submission change"""
+
+    class Meta:
+        # Used for computing the best score of a person for a problem
+        indexes = [models.Index(fields=['problem', 'participant'])]
+
 
 class ContestPerson(models.Model):
     """
@@ -237,6 +256,18 @@ class TestCase(models.Model):
                                   default='./default/outputfile.txt')
     """Output file for the test case"""
 
+    input_hash = models.CharField(max_length=64, default='')
+    """SHA-256 hash of the input file"""
+
+    output_hash = models.CharField(max_length=64, default='')
+    """SHA-256 hash of the output file"""
+
+    input_preview = models.TextField(default='')
+    """Beginning of the input file, shown on the problem page"""
+
+    output_preview = models.TextField(default='')
+    """Beginning of the output file, shown on the problem page"""
+
 
 class SubmissionTestCase(models.Model):
     """
@@ -319,3 +350,26 @@ class PersonProblemFinalScore(models.Model):
 
     class Meta:
         unique_together = (('problem', 'person'),)
+
+
+class ContestPersonScore(models.Model):
+    """
+    Model to store the total score of a person in a contest, which makes up the leaderboard.
+    """
+
+    contest = models.ForeignKey(Contest, on_delete=models.CASCADE)
+    """Foreign key to contest in which the score is saved"""
+
+    person = models.ForeignKey(Person, on_delete=models.CASCADE)
+    """Foreign key to person whose score is saved"""
+
+    score = models.FloatField(default=0.0)
+    """Sum of the final scores of the person over all problems in the contest"""
+
+    version = models.PositiveIntegerField(default=0)
+    """Scores version of the contest when the score was last changed"""
+
+    class Meta:
+        unique_together = (('contest', 'person'),)
+        indexes = [models.Index(fields=['contest', '-score']),
+                   models.Index(fields=['contest', 'version'])]
@@ -1,27 +1,73 @@
+from asgiref.sync import sync_to_async
 from django.test import TestCase, utils
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.db import connection
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
 
+import os
+import asyncio
+import tarfile
+import zipfile
+
+from io import StringIO, BytesIO
+from hashlib import sha256
+from unittest import mock
 from datetime import timedelta
 from datetime import datetime
 
+from . import forms
 from . import models
+from . import events
+from . import views
 from . import handler
 
+import submission_watcher_saver
+
 # Create your tests here.
 
 
+@utils.override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
 class IndexViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
     def test_no_contests_index_view(self):
         response = self.client.get(reverse('judge:index'))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "No active contests")
         self.assertQuerysetEqual(response.context['contests'], [])
 
+    def test_index_view_query_count(self):
+        def create_contests(count):
+            for i in range(count):
+                models.Contest.objects.create(name='Contest {}'.format(
+                                                  models.Contest.objects.count()),
+                                              start_datetime=timezone.now(),
+                                              soft_end_datetime=timezone.now(),
+                                              hard_end_datetime=timezone.now(), public=i == 1)
+            handler.bump_contest_list_version()
+
+        create_contests(2)
+        with CaptureQueriesContext(connection) as few_contests:
+            response = self.client.get(reverse('judge:index'))
+        self.assertEqual([perm for _, perm in response.context['contests']], [None, False])
+        create_contests(5)
+        with CaptureQueriesContext(connection) as many_contests:
+            self.client.get(reverse('judge:index'))
+        self.assertEqual(len(few_contests), len(many_contests))
+
 
+@utils.override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
 class ContestProblemTests(TestCase):
     def setUp(self):
+        cache.clear()
         u = User.objects.create_user(
             username='uname', email='admin@admin.org', password='1234')
 
@@ -59,8 +105,204 @@ class ContestProblemTests(TestCase):
         self.assertEqual(perm, True)
         self.assertQuerysetEqual(response.context['contests'], zip([c], [False]))
 
+    def test_contest_detail_cached_until_changed(self):
+        c = models.Contest.objects.get(name='Test Contest')
+        url = reverse('judge:contest_detail', args=(c.pk,))
+        self.client.force_login(User.objects.get(email='admin@admin.org'))
+        with CaptureQueriesContext(connection) as uncached:
+            self.assertContains(self.client.get(url), 'Test Problem 1')
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get(url)
+        self.assertLess(len(cached), len(uncached))
+        status, _ = handler.update_problem('testprob1', 'Renamed Problem', 'Statement',
+                                           'Input', 'Output', 3)
+        self.assertTrue(status)
+        self.assertContains(self.client.get(url), 'Renamed Problem')
+        person = models.Person.objects.create(email='testing1@test.com')
+        self.assertNotContains(self.client.get(url), person.email)
+        self.assertTrue(handler.update_leaderboard(c.pk, person.email, 2.0))
+        self.assertContains(self.client.get(url), person.email)
+
+    def test_testcase_preview_and_download(self):
+        big_input = ''.join('{}\n'.format(i) for i in range(5000)).encode()
+        status, _ = handler.process_testcase('testprob1', 'private',
+                                             SimpleUploadedFile('input.txt', big_input),
+                                             SimpleUploadedFile('output.txt', b'12497500\n'))
+        self.assertTrue(status)
+        testcase = models.TestCase.objects.get(problem='testprob1')
+        self.assertEqual(testcase.input_preview,
+                         '\n'.join(str(i) for i in range(20)) + '\n...')
+        self.assertEqual(testcase.output_preview, '12497500\n')
+
+        url = reverse('judge:testcase_download', args=('testprob1', testcase.pk, 'input'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(User.objects.get(email='admin@admin.org'))
+        response = self.client.get(reverse('judge:problem_detail', args=('testprob1',)))
+        self.assertEqual(response.context['private_tests'],
+                         [(testcase.input_preview, testcase.output_preview, testcase.pk)])
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), big_input)
+        response.close()
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/{}'.format(len(big_input)))
+        self.assertEqual(b''.join(response.streaming_content), big_input[10:20])
+        response = self.client.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), big_input[-5:])
+        response = self.client.get(url, HTTP_RANGE='bytes={}-'.format(len(big_input)))
+        self.assertEqual(response.status_code, 416)
+        response = self.client.get(url, HTTP_RANGE='bytes=5-2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), big_input)
+        with self.settings(FILE_SENDING_MODE='x-accel-redirect'):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected/content/testcase/inputfile_{}.txt'.format(testcase.pk))
+        handler.delete_testcase(testcase.pk)
+
+    def test_testcase_upload_hashed_and_limited(self):
+        url = reverse('judge:problem_detail', args=('testprob1',))
+        self.client.force_login(User.objects.get(email='admin@admin.org'))
+        for _ in range(2):
+            response = self.client.post(url, {
+                'test_type': 'public', 'input_file': SimpleUploadedFile('in.txt', b'1 2\n'),
+                'output_file': SimpleUploadedFile('out.txt', b'3\n')})
+        # The second upload is identical to the first one
+        self.assertContains(response, 'already been added')
+        testcase = models.TestCase.objects.get(problem='testprob1')
+        self.assertEqual(testcase.input_hash, sha256(b'1 2\n').hexdigest())
+        self.assertEqual(testcase.output_hash, sha256(b'3\n').hexdigest())
+        with self.settings(UPLOAD_MAX_SIZE=100):
+            response = self.client.post(url, {
+                'test_type': 'public', 'input_file': SimpleUploadedFile('in.txt', b'1' * 200),
+                'output_file': SimpleUploadedFile('out.txt', b'1')})
+        self.assertFalse(response.context['form'].is_valid())
+        self.assertEqual(models.TestCase.objects.filter(problem='testprob1').count(), 1)
+        handler.delete_testcase(testcase.pk)
+
+    def test_submission_status_etag(self):
+        submission = models.Submission.objects.create(
+            problem_id='testprob1', participant_id='admin@admin.org', file_type='.py',
+            timestamp=timezone.now())
+        url = reverse('judge:submission_status', args=(submission.pk,))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(User.objects.get(email='admin@admin.org'))
+        response = self.client.get(url)
+        self.assertEqual(response.json()['submissions'][0]['id'], str(submission.pk))
+        self.assertEqual(response.json()['submissions'][0]['version'], 0)
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        # Nothing changes while waiting, so the request times out with a 304
+        timeouts = []
+
+        async def wait(states, timeout, changed):
+            timeouts.append(timeout)
+            return await changed()
+
+        with mock.patch.object(events.hub, 'wait', wait):
+            response = self.client.get(url + '?wait=100', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(timeouts, [views.STATUS_LONG_POLL_TIMEOUT])
+
+        handler.invalidate_submission_status([submission.pk])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['submissions'][0]['version'], 1)
+        self.assertNotEqual(response['ETag'], etag)
+        # A new submission changes the ETag of the list of submissions as well
+        list_url = reverse('judge:problem_submissions_status', args=('testprob1',))
+        etag = self.client.get(list_url)['ETag']
+        self.assertEqual(self.client.get(list_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        models.Submission.objects.create(
+            problem_id='testprob1', participant_id='admin@admin.org', file_type='.py',
+            timestamp=timezone.now())
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.json()['submissions']), 2)
+
+    def test_update_contest_dates_keeps_versions(self):
+        now = timezone.now()
+        contest = models.Contest.objects.create(
+            name='Future Contest', start_datetime=now + timedelta(days=1),
+            soft_end_datetime=now + timedelta(days=2), hard_end_datetime=now + timedelta(days=3),
+            penalty=0, public=True)
+        models.ContestPerson.objects.create(contest=contest, person_id='admin@admin.org',
+                                            role=True)
+        self.client.force_login(User.objects.get(email='admin@admin.org'))
+        get_leaderboard_context = views._get_leaderboard_context
+
+        calls = []
+
+        def score_while_updating(*args):
+            # A submission is scored after the contest has been read by the request
+            if len(calls) == 0:
+                models.Contest.objects.filter(pk=contest.pk).update(scores_version=5)
+            calls.append(None)
+            return get_leaderboard_context(*args)
+
+        with mock.patch.object(views, '_get_leaderboard_context', score_while_updating):
+            self.client.post(reverse('judge:contest_detail', args=(contest.pk,)), {
+                'contest_start': now + timedelta(days=1),
+                'contest_soft_end': now + timedelta(days=2, hours=1),
+                'contest_hard_end': now + timedelta(days=3)})
+        contest.refresh_from_db()
+        self.assertEqual(contest.soft_end_datetime, now + timedelta(days=2, hours=1))
+        # The rescore bumps the version further, and it never goes back
+        self.assertEqual(contest.scores_version, 6)
+
+    def test_submission_page_polls_while_running(self):
+        submission = models.Submission.objects.create(
+            problem_id='testprob1', participant_id='admin@admin.org', file_type='.py',
+            timestamp=timezone.now())
+        testcase = models.TestCase.objects.create(problem_id='testprob1', public=False)
+        models.SubmissionTestCase.objects.create(submission=submission, testcase=testcase,
+                                                 verdict='R', memory_taken=0,
+                                                 time_taken=timedelta(seconds=0))
+        url = reverse('judge:submission_detail', args=(submission.pk,))
+        self.client.force_login(User.objects.get(email='admin@admin.org'))
+        # Polls only wait for a change if the status views are served with ASGI
+        self.assertContains(self.client.get(url), 'data: { wait: 0 }')
+        with self.settings(STATUS_LONG_POLLING=True):
+            self.assertContains(self.client.get(url), 'data: { wait: 25 }')
+        handler.delete_testcase(testcase.pk)
+        self.assertNotContains(self.client.get(url),
+                               reverse('judge:submission_status', args=(submission.pk,)))
 
+    def test_contest_leaderboard_status(self):
+        contest = models.Contest.objects.get(name='Test Contest')
+        url = reverse('judge:contest_leaderboard_status', args=(contest.pk,))
+        self.client.force_login(User.objects.get(email='admin@admin.org'))
+        self.assertEqual(self.client.get(url).json(), {'version': 0, 'changes': []})
+        handler.update_leaderboard(contest.pk, 'admin@admin.org', 2.0)
+        version = models.Contest.objects.get(pk=contest.pk).scores_version
+        response = self.client.get(url + '?version=0')
+        self.assertEqual(response.json(), {'version': version,
+                                           'changes': [['admin@admin.org', 2.0]]})
+        # Nothing changes while waiting, so the request times out without changes
+        waits = []
+
+        async def wait(states, timeout, changed):
+            waits.append((states, timeout))
+            return await changed()
+
+        with mock.patch.object(events.hub, 'wait', wait):
+            response = self.client.get(url, {'version': version, 'wait': 10})
+        self.assertEqual(response.json(), {'version': version, 'changes': []})
+        self.assertEqual(waits, [({('contest', contest.pk): version}, 10)])
+        # The page of a contest which has ended does not poll for the leaderboard
+        response = self.client.get(reverse('judge:contest_detail', args=(contest.pk,)))
+        self.assertNotContains(response, url)
+
+
+@utils.override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
 class HandlerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
     def test_process_and_delete_contest(self):
         status, pk = handler.process_contest(contest_name='Test Contest',
                                              contest_start='2019-04-25T12:30',
@@ -134,6 +376,40 @@ class HandlerTests(TestCase):
         p = models.Problem.objects.filter(pk='testprob1')
         self.assertEqual(len(p), 0)
 
+    def test_marked_contest_hidden_until_purged(self):
+        c = models.Contest.objects.create(name='Test Contest', start_datetime='2019-04-25T12:30',
+                                          soft_end_datetime='2019-04-26T12:30',
+                                          hard_end_datetime='2019-04-27T12:30',
+                                          penalty=0, public=True)
+        status, _ = handler.process_problem(
+            code='testprob1', contest_id=c.pk, name='Test Problem 1',
+            statement='Test Problem Statement', input_format='Test input format',
+            output_format='Test output format', difficulty=5,
+            time_limit=timedelta(seconds=10), memory_limit=10000, file_exts='.py',
+            starting_code=None, max_score=4, compilation_script=None, test_script=None)
+        self.assertTrue(status)
+        person = models.Person.objects.create(email='testing1@test.com')
+        models.Contest.objects.filter(pk=c.pk).update(deleted=True)
+        self.assertEqual(handler.get_personcontest_permissions(person.email), {})
+        self.assertIsNone(handler.get_personproblem_permission(person.email, 'testprob1'))
+        self.assertEqual(handler.get_deletion_progress(c.pk),
+                         {'problems': 1, 'submissions': 0, 'testcases': 0})
+        # The job file of a submission being judged is in use, and is left to the watcher
+        waiting, running = [models.Submission.objects.create(
+            problem_id='testprob1', participant=person, file_type='.py',
+            timestamp=timezone.now()) for _ in range(2)]
+        jobs = [os.path.join('content', 'tmp', 'sub_run_{}.txt'.format(submission.pk))
+                for submission in (waiting, running)]
+        marker = os.path.join('content', 'tmp', 'running_{}'.format(running.pk))
+        os.makedirs(os.path.join('content', 'tmp'), exist_ok=True)
+        for path in jobs + [marker]:
+            open(path, 'w').close()
+        handler.purge_deleted()
+        self.assertIsNone(handler.get_deletion_progress(c.pk))
+        self.assertFalse(models.Problem.objects.filter(pk='testprob1').exists())
+        self.assertEqual([os.path.exists(path) for path in jobs], [False, True])
+        handler._check_and_remove(jobs[1], marker)
+
     def test_process_person(self):
         person = models.Person.objects.create(email='testing1@test.com', rank=0)
         status, message = handler.process_person(person.email, 1)
@@ -187,3 +463,467 @@ class HandlerTests(TestCase):
         status, participants = handler.get_participants(contest_id=c.pk)
         self.assertTrue(status)
         self.assertEqual(len(participants), 0)
+
+    def test_add_persons_to_contest_and_roster_file(self):
+        c = models.Contest.objects.create(name='Test Contest', start_datetime='2019-04-25T12:30',
+                                          soft_end_datetime='2019-04-26T12:30',
+                                          hard_end_datetime='2019-04-27T12:30',
+                                          penalty=0, public=False)
+        models.Person.objects.create(email='testing1@test.com', rank=0)
+        handler.add_person_to_contest('testing1@test.com', c.pk, True)
+        emails = ['student{}@test.com'.format(i) for i in range(300)]
+        with self.assertNumQueries(4):
+            status, message = handler.add_persons_to_contest(emails + ['Student0@test.com'],
+                                                             c.pk, False)
+        self.assertTrue(status)
+        self.assertEqual(models.ContestPerson.objects.filter(contest=c, role=False).count(), 300)
+        status, message = handler.add_persons_to_contest(
+            ['testing1@test.com', 'student1@test.com', 'new@test.com'], c.pk, False)
+        self.assertFalse(status)
+        self.assertEqual(message.message_dict['emails'], [
+            'The following people already exist with conflicting permissions: testing1@test.com',
+            'The following people already exist with same permissions: student1@test.com'])
+        self.assertFalse(models.ContestPerson.objects.filter(person='new@test.com').exists())
+
+        roster = SimpleUploadedFile('roster.csv',
+                                    b'Email,Name\r\na@test.com,A\r\n\r\nb@test.com,B\r\n')
+        form = forms.AddPersonToContestForm({'emails': 'c@test.com'}, {'emails_file': roster})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['emails'] + form.cleaned_data['emails_file'],
+                         ['c@test.com', 'a@test.com', 'b@test.com'])
+        roster = SimpleUploadedFile('roster.csv', b'a@test.com\nnot an email\n')
+        form = forms.AddPersonToContestForm({}, {'emails_file': roster})
+        self.assertFalse(form.is_valid())
+        self.assertFalse(forms.AddPersonToContestForm({}, {}).is_valid())
+
+
+@utils.override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ScoringTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.contest = models.Contest.objects.create(name='Test Contest',
+                                                     start_datetime='2019-04-25T12:30',
+                                                     soft_end_datetime='2019-04-26T12:30',
+                                                     hard_end_datetime='2019-04-29T12:30',
+                                                     penalty=0.25, public=True)
+        self.contest.refresh_from_db()
+        self.problem = models.Problem.objects.create(code='testprob1', contest=self.contest,
+                                                     max_score=4)
+        self.person = models.Person.objects.create(email='testing1@test.com')
+
+    def test_get_penalty_multiplier(self):
+        soft_end = self.contest.soft_end_datetime
+        self.assertEqual(handler.get_penalty_multiplier(self.contest, soft_end), 1.0)
+        self.assertEqual(handler.get_penalty_multiplier(
+            self.contest, soft_end + timedelta(hours=1)), 0.75)
+        self.assertEqual(handler.get_penalty_multiplier(
+            self.contest, soft_end + timedelta(days=1, hours=1)), 0.5)
+        self.assertEqual(handler.get_penalty_multiplier(
+            self.contest, self.contest.hard_end_datetime + timedelta(seconds=1)), 0.0)
+
+    def test_update_linter_score(self):
+        sub = models.Submission.objects.create(
+            problem=self.problem, participant=self.person, file_type='.py', judge_score=8,
+            final_score=6.0, timestamp=self.contest.soft_end_datetime + timedelta(hours=1))
+        status, err = handler.update_linter_score(sub.pk, 4.0)
+        self.assertTrue(status)
+        self.assertIsNone(err)
+        sub.refresh_from_db()
+        self.assertEqual(sub.linter_score, 4.0)
+        self.assertEqual(sub.final_score, 9.0)
+        ppf = models.PersonProblemFinalScore.objects.get(person=self.person,
+                                                         problem=self.problem)
+        self.assertEqual(ppf.score, 9.0)
+        status, _ = handler.update_linter_score('nonexistent', 4.0)
+        self.assertFalse(status)
+
+        # The judge score of a rejudge, read before the linter score was saved, keeps it
+        stale = models.Submission.objects.get(pk=sub.pk)
+        models.Submission.objects.filter(pk=sub.pk).update(linter_score=2.0)
+        final_score = handler.update_submission_scores(stale.pk, self.contest, judge_score=4)
+        self.assertEqual(final_score, 4.5)
+        sub.refresh_from_db()
+        self.assertEqual((sub.judge_score, sub.linter_score, sub.final_score), (4, 2.0, 4.5))
+
+    def test_rescore_contest(self):
+        person2 = models.Person.objects.create(email='testing2@test.com')
+        soft_end = self.contest.soft_end_datetime
+        timestamps = [soft_end - timedelta(hours=1), soft_end + timedelta(hours=1),
+                      soft_end + timedelta(days=1, hours=1)]
+        for timestamp in timestamps:
+            models.Submission.objects.create(problem=self.problem, participant=self.person,
+                                             file_type='.py', judge_score=8, linter_score=2.0,
+                                             final_score=10.0, timestamp=timestamp)
+        models.Submission.objects.create(problem=self.problem, participant=person2,
+                                         file_type='.py', judge_score=4, final_score=4.0,
+                                         timestamp=timestamps[1])
+        models.PersonProblemFinalScore.objects.create(problem=self.problem,
+                                                      person=self.person, score=10.0)
+        models.PersonProblemFinalScore.objects.create(problem=self.problem,
+                                                      person=person2, score=4.0)
+
+        # Move the soft deadline one day earlier; nobody is on time anymore
+        self.contest.soft_end_datetime = soft_end - timedelta(days=1)
+        self.contest.save()
+        with CaptureQueriesContext(connection) as few:
+            status, err = handler.rescore_contest(self.contest.pk)
+        self.assertTrue(status)
+        self.assertIsNone(err)
+        # The versions of all the submissions are incremented in the same update
+        self.assertEqual(set(models.Submission.objects.values_list('version', flat=True)), {1})
+        final_scores = models.Submission.objects.filter(
+            participant=self.person).order_by('timestamp').values_list('final_score', flat=True)
+        self.assertEqual(list(final_scores), [7.5, 5.0, 2.5])
+        for submission in models.Submission.objects.all():
+            self.assertEqual(submission.final_score,
+                             max(0.0, (submission.judge_score + submission.linter_score) *
+                                 handler.get_penalty_multiplier(self.contest,
+                                                                submission.timestamp)))
+        self.assertEqual(models.PersonProblemFinalScore.objects.get(person=self.person).score, 7.5)
+        self.assertEqual(models.PersonProblemFinalScore.objects.get(person=person2).score, 2.0)
+        status, leaderboard = handler.get_leaderboard(self.contest.pk)
+        self.assertTrue(status)
+        self.assertEqual(leaderboard, [['testing1@test.com', 7.5], ['testing2@test.com', 2.0]])
+
+        models.Submission.objects.bulk_create(
+            [models.Submission(problem=self.problem, participant=person2, file_type='.py',
+                               timestamp=timestamps[0]) for _ in range(100)])
+        with CaptureQueriesContext(connection) as many:
+            handler.rescore_contest(self.contest.pk)
+        self.assertEqual(len(many), len(few))
+
+    def test_delete_testcase_rescores_problem(self):
+        testcases = [models.TestCase.objects.create(problem=self.problem, public=False)
+                     for _ in range(3)]
+        sub = models.Submission.objects.create(
+            problem=self.problem, participant=self.person, file_type='.py', judge_score=8,
+            linter_score=2.0, final_score=10.0,
+            timestamp=self.contest.soft_end_datetime - timedelta(hours=1))
+        for testcase, verdict in zip(testcases, ['P', 'P', 'F']):
+            models.SubmissionTestCase.objects.create(submission=sub, testcase=testcase,
+                                                     verdict=verdict, memory_taken=0,
+                                                     time_taken=timedelta(seconds=0))
+        models.PersonProblemFinalScore.objects.create(problem=self.problem,
+                                                      person=self.person, score=10.0)
+        self.assertTrue(handler.rebuild_leaderboard(self.contest.pk))
+
+        status, err = handler.delete_testcase(testcases[0].pk)
+        self.assertTrue(status)
+        self.assertIsNone(err)
+        sub.refresh_from_db()
+        self.assertEqual(sub.judge_score, 4)
+        self.assertEqual(sub.final_score, 6.0)
+        self.assertEqual(sub.version, 1)
+        self.assertEqual(models.PersonProblemFinalScore.objects.get(person=self.person).score,
+                         6.0)
+        self.assertEqual(handler.get_personcontest_score(self.person.email, self.contest.pk),
+                         (True, 6.0))
+        status, _ = handler.delete_testcase(testcases[0].pk)
+        self.assertFalse(status)
+
+    def test_process_testcase_archive(self):
+        sub = models.Submission.objects.create(problem=self.problem, participant=self.person,
+                                               file_type='.py', timestamp=timezone.now())
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_archive:
+            for name in ['public/1', 'tests/2', 'tests/3']:
+                zip_archive.writestr(name + '.in', name)
+                zip_archive.writestr(name + '.out', name[::-1])
+            zip_archive.writestr('README.txt', 'Ignored')
+            # Files added by macOS are not test cases
+            for name in ['__MACOSX/public/._1', 'public/._1', '.hidden/5']:
+                zip_archive.writestr(name + '.in', 'Ignored')
+                zip_archive.writestr(name + '.out', 'Ignored')
+        status, count = handler.process_testcase_archive(
+            self.problem.pk, SimpleUploadedFile('tests.zip', archive.getvalue()))
+        self.assertTrue(status)
+        self.assertEqual(count, 3)
+        testcases = models.TestCase.objects.filter(problem=self.problem).order_by('input_preview')
+        self.assertEqual([(t.input_preview, t.output_preview, t.public) for t in testcases],
+                         [('public/1', '1/cilbup', True), ('tests/2', '2/stset', False),
+                          ('tests/3', '3/stset', False)])
+        with testcases[1].inputfile.open('rb') as f:
+            self.assertEqual(f.read(), b'tests/2')
+        # The existing submission is judged on the new testcases
+        self.assertEqual(models.SubmissionTestCase.objects.filter(
+            submission=sub, verdict='R').count(), 3)
+        # Test cases which have already been added are skipped
+        status, count = handler.process_testcase_archive(
+            self.problem.pk, SimpleUploadedFile('tests.zip', archive.getvalue()))
+        self.assertEqual((status, count), (True, 0))
+
+        archive = BytesIO()
+        with tarfile.open(fileobj=archive, mode='w:gz') as tar_archive:
+            member = tarfile.TarInfo('4.in')
+            member.size = 1
+            tar_archive.addfile(member, BytesIO(b'4'))
+        status, err = handler.process_testcase_archive(
+            self.problem.pk, SimpleUploadedFile('tests.tar.gz', archive.getvalue()))
+        self.assertFalse(status)
+        self.assertIn('4', err.message)
+        status, _ = handler.process_testcase_archive(
+            self.problem.pk, SimpleUploadedFile('tests.zip', b'Not an archive'))
+        self.assertFalse(status)
+        self.assertEqual(models.TestCase.objects.filter(problem=self.problem).count(), 3)
+        for testcase in testcases:
+            handler.delete_testcase(testcase.pk)
+
+    def test_process_submission_query_count(self):
+        def submit():
+            with CaptureQueriesContext(connection) as queries:
+                status, err = handler.process_submission(
+                    self.problem.pk, self.person.email, '.py',
+                    SimpleUploadedFile('sub.py', b'print(1)\n'), timezone.now())
+            self.assertTrue(status)
+            self.assertIsNone(err)
+            return [query['sql'] for query in queries.captured_queries]
+
+        models.TestCase.objects.bulk_create(
+            [models.TestCase(problem=self.problem, public=False) for _ in range(5)])
+        few = submit()
+        models.TestCase.objects.bulk_create(
+            [models.TestCase(problem=self.problem, public=False) for _ in range(295)])
+        many = submit()
+        # The verdict rows are inserted in batches, which SQLite limits by the number of
+        # query parameters, and no other query depends on the number of testcases
+        inserts = [sql for sql in many if sql.startswith('INSERT INTO "judge_submissiontestcase"')]
+        self.assertLessEqual(len(inserts), 300 // 100)
+        self.assertEqual(len(many) - len(inserts), len(few) - 1)
+        self.assertEqual(models.SubmissionTestCase.objects.filter(
+            submission__in=models.Submission.objects.order_by('-timestamp')[:1]).count(), 300)
+        for submission in models.Submission.objects.all():
+            handler._check_and_remove(submission.submission_file.path)
+
+    def test_new_submission_judged_before_rejudges(self):
+        old, new = [models.Submission.objects.create(
+            problem=self.problem, participant=self.person, file_type='.py',
+            timestamp=timezone.now()) for _ in range(2)]
+        testcase = models.TestCase.objects.create(problem=self.problem, public=False)
+        handler._queue_rejudge(self.problem, [(old.pk, '.py')], [str(testcase.pk)])
+        handler._queue_job('sub_run_{}'.format(new.pk), self.problem, new.pk, '.py',
+                           [str(testcase.pk)])
+        rejudge, = handler._rejudge_jobs([old.pk])
+        # The new submission is picked by the live lane, although it was queued later
+        sub_file, sub_id = submission_watcher_saver._next_job(
+            submission_watcher_saver.LIVE_JOB_PREFIXES)
+        self.assertEqual((os.path.basename(sub_file), sub_id),
+                         ('sub_run_{}.txt'.format(new.pk), str(new.pk)))
+        # and the rejudge only by the low-priority lane
+        sub_file, sub_id = submission_watcher_saver._next_job(
+            submission_watcher_saver.BULK_JOB_PREFIXES)
+        self.assertEqual((os.path.basename(sub_file), sub_id), (rejudge, str(old.pk)))
+        self.assertIsNone(submission_watcher_saver._next_job(
+            submission_watcher_saver.LIVE_JOB_PREFIXES))
+        for sub_id in (str(old.pk), str(new.pk)):
+            submission_watcher_saver.RUNNING.discard(sub_id)
+            handler._check_and_remove(submission_watcher_saver._running_marker(sub_id))
+        handler._check_and_remove(sub_file, os.path.join(
+            'content', 'tmp', 'sub_run_{}.txt'.format(new.pk)))
+
+    def test_rejudge_problem(self):
+        status, _ = handler.rejudge_problem(self.problem.pk)
+        self.assertFalse(status)
+        models.TestCase.objects.create(problem=self.problem, public=False)
+        submissions = [models.Submission.objects.create(
+            problem=self.problem, participant=self.person, file_type='.py',
+            timestamp=timezone.now()) for _ in range(2)]
+        # The executable may be in use, so the job compiles it again instead of removing it
+        executable = os.path.join('content', 'submissions',
+                                  'submission_{}'.format(submissions[0].pk))
+        os.makedirs(os.path.dirname(executable), exist_ok=True)
+        open(executable, 'w').close()
+        for _ in range(2):
+            status, err = handler.rejudge_problem(self.problem.pk)
+            self.assertTrue(status)
+            self.assertIsNone(err)
+        self.assertTrue(os.path.exists(executable))
+        job, = handler._rejudge_jobs([submissions[0].pk])
+        with open(os.path.join('content', 'tmp', job)) as f:
+            self.assertEqual(f.read().split('\n')[5], '1')
+        # Submissions waiting to be rejudged are not queued again
+        self.assertEqual(handler.get_rejudge_progress(self.problem.pk), 2)
+        # The queued jobs are removed with the problem
+        models.Problem.objects.filter(pk=self.problem.pk).update(deleted=True)
+        handler.purge_deleted()
+        self.assertEqual(handler.get_rejudge_progress(self.problem.pk), 0)
+
+    def test_update_and_get_leaderboard(self):
+        status, message = handler.get_leaderboard(self.contest.pk)
+        self.assertFalse(status)
+        problem2 = models.Problem.objects.create(code='testprob2', contest=self.contest)
+        person2 = models.Person.objects.create(email='testing2@test.com')
+        models.PersonProblemFinalScore.objects.create(problem=self.problem,
+                                                      person=self.person, score=3.0)
+        models.PersonProblemFinalScore.objects.create(problem=self.problem,
+                                                      person=person2, score=5.0)
+        self.assertTrue(handler.update_leaderboard(self.contest.pk, self.person.email))
+        self.assertTrue(handler.update_leaderboard(self.contest.pk, person2.email))
+        status, leaderboard = handler.get_leaderboard(self.contest.pk)
+        self.assertTrue(status)
+        self.assertEqual(leaderboard, [['testing2@test.com', 5.0], ['testing1@test.com', 3.0]])
+        models.PersonProblemFinalScore.objects.create(problem=problem2,
+                                                      person=self.person, score=4.0)
+        self.assertTrue(handler.update_leaderboard(self.contest.pk, 'Testing1@test.com'))
+        status, leaderboard = handler.get_leaderboard(self.contest.pk)
+        self.assertEqual(leaderboard, [['testing1@test.com', 7.0], ['testing2@test.com', 5.0]])
+
+    def test_leaderboard_window_and_rank(self):
+        for i, score in enumerate([9.0, 7.0, 7.0, 5.0, 7.0]):
+            person = models.Person.objects.create(email='rank{}@test.com'.format(i))
+            models.ContestPersonScore.objects.create(contest=self.contest, person=person,
+                                                     score=score)
+        self.assertEqual(handler.get_leaderboard_size(self.contest.pk), 5)
+        status, window = handler.get_leaderboard_window(self.contest.pk, 0, 5)
+        self.assertTrue(status)
+        self.assertEqual([entry[0] for entry in window], [1, 2, 2, 2, 5])
+        status, window = handler.get_leaderboard_window(self.contest.pk, 2, 3, dense=True)
+        self.assertEqual(window, [[2, 'rank2@test.com', 7.0], [2, 'rank4@test.com', 7.0],
+                                  [3, 'rank3@test.com', 5.0]])
+        status, (rank, window) = handler.get_leaderboard_rank(self.contest.pk, 'Rank3@test.com',
+                                                              neighbours=1)
+        self.assertTrue(status)
+        self.assertEqual(rank, 5)
+        self.assertEqual([entry[1] for entry in window], ['rank4@test.com', 'rank3@test.com'])
+        status, _ = handler.get_leaderboard_rank(self.contest.pk, 'testing1@test.com')
+        self.assertFalse(status)
+
+    def test_leaderboard_deltas_and_rebuild(self):
+        self.assertTrue(handler.update_leaderboard(self.contest.pk, 'testing1@test.com', 2.5))
+        self.assertTrue(handler.update_leaderboard(self.contest.pk, 'testing1@test.com', 1.0))
+        self.assertEqual(handler.get_personcontest_score('testing1@test.com', self.contest.pk),
+                         (True, 3.5))
+        models.PersonProblemFinalScore.objects.create(problem=self.problem,
+                                                      person=self.person, score=3.0)
+        call_command('rebuild_leaderboards', stdout=StringIO())
+        self.assertEqual(handler.get_personcontest_score('testing1@test.com', self.contest.pk),
+                         (True, 3.0))
+        status, csv_lines = handler.get_csv(self.contest.pk)
+        self.assertEqual(''.join(csv_lines).splitlines(),
+                         ['Email,Score', 'testing1@test.com,3.0'])
+        problem2 = models.Problem.objects.create(code='testprob2', contest=self.contest)
+        person2 = models.Person.objects.create(email='testing2@test.com')
+        models.PersonProblemFinalScore.objects.create(problem=problem2, person=person2, score=1.5)
+        models.PersonProblemFinalScore.objects.create(problem=problem2, person=self.person,
+                                                      score=2.0)
+        status, csv_lines = handler.get_csv(self.contest.pk, per_problem=True)
+        self.assertEqual(''.join(csv_lines).splitlines(),
+                         ['Email,Score,testprob1,testprob2', 'testing1@test.com,5.0,3.0,2.0',
+                          'testing2@test.com,1.5,,1.5'])
+
+    def test_get_score_matrix(self):
+        problem2 = models.Problem.objects.create(code='testprob2', contest=self.contest)
+        person2 = models.Person.objects.create(email='testing2@test.com')
+        for person, problem, score, day in [(self.person, self.problem, 1.0, 1),
+                                            (self.person, self.problem, 4.0, 2),
+                                            (self.person, self.problem, 4.0, 3),
+                                            (person2, problem2, 2.0, 1),
+                                            (person2, self.problem, 0.0, 1)]:
+            models.Submission.objects.create(
+                problem=problem, participant=person, file_type='.py', final_score=score,
+                timestamp=datetime(2019, 4, 25, day, tzinfo=timezone.utc))
+        for person, problem, score in [(self.person, self.problem, 4.0),
+                                       (person2, problem2, 2.0)]:
+            models.PersonProblemFinalScore.objects.create(person=person, problem=problem,
+                                                          score=score)
+        handler.rebuild_leaderboard(self.contest.pk)
+        status, matrix = handler.get_score_matrix(self.contest.pk)
+        self.assertTrue(status)
+        self.assertEqual(matrix['problems'], ['testprob1', 'testprob2'])
+        self.assertEqual([row[:3] for row in matrix['rows']],
+                         [[1, 'testing1@test.com', 4.0], [2, 'testing2@test.com', 2.0]])
+        self.assertEqual(matrix['rows'][0][3], [
+            {'score': 4.0, 'attempts': 3,
+             'best_time': datetime(2019, 4, 25, 2, tzinfo=timezone.utc)}, None])
+        self.assertEqual(matrix['rows'][1][3][0],
+                         {'score': None, 'attempts': 1, 'best_time': None})
+        self.assertEqual(matrix['rows'][1][3][1]['attempts'], 1)
+        with self.assertNumQueries(1):
+            handler.get_score_matrix(self.contest.pk)
+
+    def test_event_hub(self):
+        hub = events.EventHub(poll_interval=3600)
+        contest_queue = hub.subscribe(('contest', self.contest.pk), self.contest.scores_version)
+        handler.update_leaderboard(self.contest.pk, 'testing1@test.com', 2.0)
+        self.contest.refresh_from_db()
+        hub.poll({('contest', self.contest.pk): 0})
+        self.assertEqual(contest_queue.get_nowait(), ('leaderboard', self.contest.scores_version,
+                                                      [['testing1@test.com', 2.0]]))
+        self.assertEqual(events.format_event(('leaderboard', 2, [['a@b.c', 1.0]])),
+                         'event: leaderboard\nid: 2\ndata: [["a@b.c", 1.0]]\n\n')
+
+        submission = models.Submission.objects.create(problem=self.problem, participant=self.person,
+                                                      file_type='.py', timestamp=timezone.now())
+        submission_id = str(submission.pk)
+        status = handler.get_submission_verdicts([submission_id])[submission_id]
+        submission_queue = hub.subscribe(('submission', submission_id), status)
+        hub.poll({('submission', submission_id): status})
+        self.assertTrue(submission_queue.empty())
+        models.Submission.objects.filter(pk=submission_id).update(final_score=3.0)
+        hub.poll({('submission', submission_id): status})
+        self.assertEqual(submission_queue.get_nowait()[2]['final_score'], 3.0)
+        hub.unsubscribe(('submission', submission_id), submission_queue)
+        hub.unsubscribe(('contest', self.contest.pk), contest_queue)
+        self.assertEqual(hub._listeners, {})
+
+        # A waiting coroutine is woken up by the events, and checks for the change itself
+        checks = []
+
+        async def changed():
+            checks.append(None)
+            if len(checks) == 1:
+                hub.publish(('submission', submission_id), ('verdict', None, status))
+            return len(checks) > 1
+
+        waited = asyncio.run(hub.wait({('submission', submission_id): status}, 5, changed))
+        self.assertTrue(waited)
+        self.assertEqual(len(checks), 2)
+        self.assertFalse(asyncio.run(hub.wait({}, 0.01, sync_to_async(lambda: False))))
+        self.assertEqual(hub._listeners, {})
+
+    def test_get_submission_status(self):
+        testcase = models.TestCase.objects.create(problem=self.problem, public=True)
+        submission = models.Submission.objects.create(problem=self.problem, participant=self.person,
+                                                      file_type='.py', timestamp=timezone.now())
+        submission_id = str(submission.pk)
+        st = models.SubmissionTestCase.objects.create(submission=submission, testcase=testcase,
+                                                      verdict='R', memory_taken=0,
+                                                      time_taken=timedelta(seconds=0))
+        status, (verdicts, _) = handler.get_submission_status(submission_id)
+        self.assertEqual(verdicts[str(testcase.pk)][0], 'Running')
+        st.verdict = 'P'
+        st.save()
+        with self.assertNumQueries(2):
+            status, (verdicts, scores) = handler.get_submission_status(submission_id)
+        self.assertEqual(verdicts[str(testcase.pk)][0], 'Passed')
+        # Only the version of the submission is read when the status is cached
+        with self.assertNumQueries(1):
+            self.assertEqual(handler.get_submission_status(submission_id),
+                             (True, (verdicts, scores)))
+        handler.update_poster_score(submission_id, 2)
+        status, (verdicts, scores) = handler.get_submission_status(submission_id)
+        self.assertEqual(scores[1], 2)
+
+    def test_get_submissions_pages_and_comments(self):
+        for email in ['c@test.com', 'a@test.com', 'b@test.com']:
+            person = models.Person.objects.create(email=email)
+            for hour in [2, 1]:
+                models.Submission.objects.create(
+                    problem=self.problem, participant=person, file_type='.py',
+                    timestamp=datetime(2019, 4, 25, hour, tzinfo=timezone.utc))
+            models.Comment.objects.create(problem=self.problem, person=person,
+                                          commenter=self.person, timestamp=timezone.now(),
+                                          comment='Comment for {}'.format(email))
+        status, page = handler.get_submissions('testprob1', None, limit=2)
+        self.assertTrue(status)
+        self.assertEqual(list(page), ['a@test.com', 'b@test.com'])
+        self.assertEqual([sub.timestamp.hour for sub in page['a@test.com']], [1, 2])
+        status, page = handler.get_submissions('testprob1', None, after='b@test.com', limit=2)
+        self.assertEqual(list(page), ['c@test.com'])
+        status, page = handler.get_submissions('testprob1', 'testing1@test.com')
+        self.assertEqual(page, {'testing1@test.com': []})
+        with self.assertNumQueries(1):
+            comments = handler.get_comments_of_persons('testprob1', ['a@test.com', 'd@test.com'])
+            self.assertEqual(comments['a@test.com'][0][0].email, 'testing1@test.com')
+        self.assertEqual(comments['a@test.com'][0][2], 'Comment for a@test.com')
+        self.assertEqual(comments['d@test.com'], [])
@@ -0,0 +1,47 @@
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler, StopUpload
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload handler which streams every uploaded file to a temporary file on disk, and computes
+    the SHA-256 hash of the file while it is being received. The hash is available as the
+    ``content_hash`` attribute of the uploaded file. Since nothing is kept in memory, the
+    memory used by a request does not depend on the size of the upload.
+
+    Requests larger than ``UPLOAD_MAX_SIZE`` bytes are stopped. If the request gives its
+    length, it is stopped before its files are read.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = getattr(settings, 'UPLOAD_MAX_SIZE', None)
+        self.received = 0
+        self.too_large = False
+        self.content_hash = sha256()
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.too_large = self.max_size is not None and content_length > self.max_size
+        # The fields before the first file, including the CSRF token, are still parsed
+        return None
+
+    def new_file(self, *args, **kwargs):
+        if self.too_large:
+            raise StopUpload(connection_reset=True)
+        super().new_file(*args, **kwargs)
+        self.content_hash = sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        # The length is not given for chunked requests, so it is checked as the data arrives
+        self.received += len(raw_data)
+        if self.max_size is not None and self.received > self.max_size:
+            raise StopUpload(connection_reset=True)
+        self.content_hash.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.content_hash = self.content_hash.hexdigest()
+        return uploaded_file
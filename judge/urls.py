@@ -20,6 +20,11 @@ urlpatterns = [
     path('contest/new/', views.new_contest, name='new_contest'),
     path('contest/<int:contest_id>/', views.contest_detail, name='contest_detail'),
     path('contest/<int:contest_id>/scores/', views.contest_scores_csv, name='contest_scores_csv'),
+    path('contest/<int:contest_id>/events/', views.contest_events, name='contest_events'),
+    path('contest/<int:contest_id>/leaderboard/status/',
+         views.contest_leaderboard_status, name='contest_leaderboard_status'),
+    path('contest/<int:contest_id>/matrix/', views.contest_score_matrix,
+         name='contest_score_matrix'),
     path('contest/<int:contest_id>/delete/', views.delete_contest, name='delete_contest'),
     path('contest/<int:contest_id>/problem/new/',
          views.new_problem, name='new_problem'),
@@ -35,6 +40,7 @@ urlpatterns = [
     # Problem-specific paths
     path('problem/<str:problem_id>/', views.problem_detail, name='problem_detail'),
     path('problem/<str:problem_id>/delete/', views.delete_problem, name='delete_problem'),
+    path('problem/<str:problem_id>/rejudge/', views.rejudge_problem, name='rejudge_problem'),
     path('problem/<str:problem_id>/starting-code/',
          views.problem_starting_code, name='problem_starting_code'),
     path('problem/<str:problem_id>/compilation-script/',
@@ -47,12 +53,20 @@ urlpatterns = [
          views.edit_problem, name='edit_problem'),
     path('problem/<str:problem_id>/submissions/',
          views.problem_submissions, name='problem_submissions'),
+    path('problem/<str:problem_id>/submissions/status/',
+         views.problem_submissions_status, name='problem_submissions_status'),
 
     # Submission-specific paths
     path('submission/<str:submission_id>/',
          views.submission_detail, name='submission_detail'),
+    path('submission/<str:submission_id>/events/',
+         views.submission_events, name='submission_events'),
+    path('submission/<str:submission_id>/status/',
+         views.submission_status, name='submission_status'),
     path('submission/<str:submission_id>/download/',
          views.submission_download, name='submission_download'),
     path('problem/<str:problem_id>/testcase/<str:testcase_id>/delete/',
          views.delete_testcase, name='delete_testcase'),
+    path('problem/<str:problem_id>/testcase/<str:testcase_id>/download/<str:kind>/',
+         views.testcase_download, name='testcase_download'),
 ]
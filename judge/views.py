@@ -1,17 +1,42 @@
 import os
+import re
 
+from hashlib import sha1
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
 from django.urls import reverse
-from django.core.files import File
 from django.utils import timezone
-from django.http import HttpResponse
+from django.utils.http import parse_etags
+from django.http import HttpResponse, StreamingHttpResponse, FileResponse
+from django.http import JsonResponse, HttpResponseNotModified
 from django.contrib.auth.models import User
 from django.shortcuts import render, redirect, get_object_or_404
 
+from . import events
 from . import handler
 from .models import Contest, Problem, TestCase, Submission
 from .forms import NewContestForm, AddPersonToContestForm, DeletePersonFromContestForm
 from .forms import NewProblemForm, EditProblemForm, NewSubmissionForm, AddTestCaseForm
 from .forms import NewCommentForm, UpdateContestForm, AddPosterScoreForm
+from .forms import AddTestCaseArchiveForm
+
+LEADERBOARD_PAGE_SIZE = 50
+SUBMISSIONS_PAGE_SIZE = 50
+
+# Cached pages are invalidated by the versions in their keys, so this only bounds the
+# lifetime of the pages of old versions
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Longest time in seconds that a status request with the ``wait`` parameter is held open
+STATUS_LONG_POLL_TIMEOUT = 30
+
+# Bytes read at a time while streaming a file
+FILE_CHUNK_SIZE = 64 * 1024
+# A single range of bytes in a Range header; requests for multiple ranges get the full file
+_BYTE_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
 
 
 def _get_user(request) -> User:
@@ -28,15 +53,216 @@ def _get_user(request) -> User:
         return None
 
 
-def _return_file_as_response(path_name):
-    f = File(open(path_name, 'rb'))
-    response = HttpResponse(f, content_type='application/octet-stream')
-    f.close()
-    f_name = os.path.basename(path_name)
-    response['Content-Disposition'] = 'attachment; filename="{}"'.format(f_name)
+def _get_contest_permissions(request, contest_ids=None) -> dict:
+    # The permissions of the user are memoized on the request, so that they are
+    # fetched at most once per contest in a request
+    if not hasattr(request, '_contest_permissions'):
+        request._contest_permissions = {}
+    missing = None if contest_ids is None else [
+        contest_id for contest_id in contest_ids if contest_id not in request._contest_permissions]
+    if missing is None or len(missing) > 0:
+        user = _get_user(request)
+        permissions = handler.get_personcontest_permissions(
+            None if user is None else user.email, missing)
+        request._contest_permissions.update(
+            permissions if missing is None else
+            {contest_id: permissions.get(contest_id) for contest_id in missing})
+    return request._contest_permissions
+
+
+def _get_contest_permission(request, contest_id: int):
+    return _get_contest_permissions(request, [contest_id])[contest_id]
+
+
+def _get_problem_permission(request, problem_id: str):
+    # Same as handler.get_personproblem_permission, using the memoized permissions
+    problem = Problem.objects.filter(code=problem_id).values('contest', 'deleted').first()
+    if problem is None or problem['contest'] is None:
+        return False
+    if problem['deleted']:
+        return None
+    return _get_contest_permission(request, problem['contest'])
+
+
+def _read_file_range(f, length: int):
+    # Generator of the next length bytes of the file, which is closed at the end
+    try:
+        while length > 0:
+            chunk = f.read(min(FILE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def _return_file_as_response(request, path_name, f_name=None):
+    # The file is never read into memory at once. If FILE_SENDING_MODE is set, then the
+    # front web server sends the file; otherwise it is streamed in chunks, and a single
+    # byte range is supported so that downloads can be resumed.
+    f_name = f_name or os.path.basename(path_name)
+    mode = getattr(settings, 'FILE_SENDING_MODE', None)
+    if mode in ('x-sendfile', 'x-accel-redirect'):
+        response = HttpResponse(content_type='application/octet-stream')
+        if mode == 'x-sendfile':
+            response['X-Sendfile'] = os.path.abspath(path_name)
+        else:
+            relative_path = os.path.relpath(os.path.abspath(path_name), settings.MEDIA_ROOT)
+            response['X-Accel-Redirect'] = '{}/{}'.format(
+                settings.X_ACCEL_REDIRECT_PREFIX.rstrip('/'),
+                quote(relative_path.replace(os.sep, '/')))
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(f_name)
+        return response
+
+    size = os.path.getsize(path_name)
+    byte_range = _BYTE_RANGE_RE.match(request.META.get('HTTP_RANGE', ''))
+    if byte_range is not None:
+        first, last = byte_range.groups()
+        # An invalid range, such as bytes=5-2, is ignored as per RFC 7233
+        if first == last == '' or (first != '' and last != '' and int(last) < int(first)):
+            byte_range = None
+    if byte_range is None:
+        response = FileResponse(open(path_name, 'rb'), as_attachment=True, filename=f_name)
+    else:
+        if first == '':
+            # bytes=-N is the last N bytes
+            start, end = max(0, size - int(last)), size - 1
+        else:
+            start, end = int(first), size - 1 if last == '' else min(int(last), size - 1)
+        # Only a range starting after the end of the file (or an empty suffix of it) cannot
+        # be satisfied
+        if start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+            return response
+        f = open(path_name, 'rb')
+        f.seek(start)
+        response = StreamingHttpResponse(_read_file_range(f, end - start + 1), status=206,
+                                         content_type='application/octet-stream')
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+        response['Content-Length'] = end - start + 1
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(f_name)
+    response['Accept-Ranges'] = 'bytes'
     return response
 
 
+def _get_leaderboard_context(request, contest, user) -> dict:
+    # Only a page of the leaderboard is rendered, along with the rank of the user.
+    # Both are cached under the scores version of the contest, which changes with any score.
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+
+    def leaderboard_page():
+        status, leaderboard = handler.get_leaderboard_window(
+            contest.pk, (page - 1) * LEADERBOARD_PAGE_SIZE, LEADERBOARD_PAGE_SIZE)
+        size = handler.get_leaderboard_size(contest.pk)
+        return status, leaderboard, max(1, -(-size // LEADERBOARD_PAGE_SIZE))
+
+    status, leaderboard, num_pages = cache.get_or_set(
+        'leaderboard_{}_{}_{}'.format(contest.pk, contest.scores_version, page),
+        leaderboard_page, FRAGMENT_CACHE_TIMEOUT)
+    context = {
+        'leaderboard_status': status,
+        'leaderboard': leaderboard,
+        'leaderboard_page': page,
+        'leaderboard_num_pages': num_pages,
+        'leaderboard_user_rank': None,
+    }
+    if user is not None:
+        def user_rank():
+            rank_status, rank = handler.get_leaderboard_rank(contest.pk, user.email,
+                                                             neighbours=0)
+            return rank[0] if rank_status else None
+
+        context['leaderboard_user_rank'] = cache.get_or_set(
+            'leaderboard_rank_{}_{}_{}'.format(contest.pk, contest.scores_version,
+                                               quote(user.email)),
+            user_rank, FRAGMENT_CACHE_TIMEOUT)
+    return context
+
+
+def _event_stream_response(key, state, catch_up):
+    response = StreamingHttpResponse(events.hub.listen(key, state, catch_up),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Disable buffering of the stream by nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _status_poll_context() -> dict:
+    # How the pages poll for live updates: a poll waits for a change only if the status
+    # views are served with ASGI, and is repeated after an interval otherwise
+    long_polling = getattr(settings, 'STATUS_LONG_POLLING', False)
+    return {
+        'status_poll_wait': STATUS_LONG_POLL_TIMEOUT - 5 if long_polling else 0,
+        'status_poll_interval': 0 if long_polling else
+        1000 * getattr(settings, 'STATUS_POLL_INTERVAL', 10),
+    }
+
+
+def _status_etag(versions) -> str:
+    # Strong ETag of a list of (submission ID, version) pairs
+    digest = sha1(','.join('{}:{}'.format(submission_id, version)
+                           for submission_id, version in versions).encode()).hexdigest()
+    return '"{}"'.format(digest)
+
+
+def _long_poll_wait(request) -> int:
+    # Seconds for which a status request may wait for a change, from its ``wait`` parameter
+    try:
+        return min(max(0, int(request.GET.get('wait', 0))), STATUS_LONG_POLL_TIMEOUT)
+    except ValueError:
+        return 0
+
+
+async def _status_response(request, get_versions, get_payload):
+    # A poll is answered with 304 if none of the submissions have changed since the ETag
+    # sent by the client, which only needs the versions of the submissions. If ``wait``
+    # seconds are given, the response is held until any of the submissions changes.
+    # The database is only used from threads, and no thread is held while waiting.
+    get_versions = sync_to_async(get_versions)
+    versions = await get_versions()
+    client_etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if _status_etag(versions) in client_etags:
+        wait = _long_poll_wait(request)
+        if wait > 0 and len(versions) > 0:
+            states = await sync_to_async(handler.get_submission_verdicts)(
+                [submission_id for submission_id, _ in versions])
+
+            async def changed():
+                return _status_etag(await get_versions()) not in client_etags
+
+            await events.hub.wait({('submission', submission_id): state
+                                   for submission_id, state in states.items()}, wait, changed)
+            versions = await get_versions()
+        if _status_etag(versions) in client_etags:
+            response = HttpResponseNotModified()
+            response['ETag'] = _status_etag(versions)
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+
+    # The ETag is computed from the versions read along with the payload, so that it never
+    # belongs to a newer version than the payload
+    payload = await sync_to_async(get_payload)(
+        [submission_id for submission_id, _ in versions])
+    response = JsonResponse(payload)
+    response['ETag'] = _status_etag([(submission['id'], submission['version'])
+                                     for submission in payload['submissions']])
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _submissions_status_payload(submission_ids) -> dict:
+    statuses = handler.get_submission_verdicts(submission_ids)
+    return {'submissions': [dict(id=submission_id, **statuses[submission_id])
+                            for submission_id in submission_ids
+                            if submission_id in statuses]}
+
+
 def handler404(request, *args):
     """
     Renders 404 page.
@@ -70,10 +296,17 @@ def index(request):
         status, maybe_error = handler.process_person(request.user.email)
         if not status:
             return handler404(request)
-    contests = Contest.objects.all()
-    permissions = [handler.get_personcontest_permission(
-        None if user is None else user.email, contest.pk) for contest in contests]
-    context['contests'] = zip(contests, permissions)
+    contests = cache.get_or_set(
+        'contest_list_{}'.format(handler.get_contest_list_version()),
+        lambda: list(Contest.objects.filter(deleted=False)), FRAGMENT_CACHE_TIMEOUT)
+    permissions = _get_contest_permissions(request)
+    context['contests'] = [(contest, permissions.get(contest.pk)) for contest in contests]
+    if user is not None:
+        # Posters can follow the deletion of their contests
+        context['deleted_contests'] = [
+            (contest, handler.get_deletion_progress(contest.pk))
+            for contest in Contest.objects.filter(deleted=True, contestperson__person=user.email,
+                                                  contestperson__role=True)]
     return render(request, 'judge/index.html', context)
 
 
@@ -114,9 +347,7 @@ def get_people(request, contest_id, role):
     :param role: ``True`` for Poster, ``False`` for Participant
     :type role: bool
     """
-    user = _get_user(request)
-    perm = handler.get_personcontest_permission(
-        None if user is None else user.email, contest_id)
+    perm = _get_contest_permission(request, contest_id)
     if perm is None:
         return handler404(request)
     if role is None:
@@ -183,17 +414,15 @@ def add_person(request, contest_id, role):
     :param role: ``True`` for Poster, ``False`` for Participant
     :type role: bool
     """
-    user = _get_user(request)
-    perm = handler.get_personcontest_permission(
-        None if user is None else user.email, contest_id)
+    perm = _get_contest_permission(request, contest_id)
     if not (perm is True):
         return handler404(request)
     context = {'contest_id': contest_id,
                'type': 'Poster' if role else 'Participant'}
     if request.method == 'POST':
-        form = AddPersonToContestForm(request.POST)
+        form = AddPersonToContestForm(request.POST, request.FILES)
         if form.is_valid():
-            emails = form.cleaned_data['emails']
+            emails = form.cleaned_data['emails'] + form.cleaned_data['emails_file']
             status, maybe_error = handler.add_persons_to_contest(emails, contest_id, role)
             if status:
                 return redirect(reverse('judge:get_{}s'.format(context['type'].lower()),
@@ -241,23 +470,23 @@ def contest_detail(request, contest_id):
     :param contest_id: the contest ID
     :type contest_id: int
     """
-    contest = get_object_or_404(Contest, pk=contest_id)
+    contest = get_object_or_404(Contest, pk=contest_id, deleted=False)
     user = _get_user(request)
-    perm = handler.get_personcontest_permission(
-        None if user is None else user.email, contest_id)
+    perm = _get_contest_permission(request, contest_id)
     if perm is None:
         return handler404(request)
-    problems = Problem.objects.filter(contest_id=contest_id)
-    status, leaderboard = handler.get_leaderboard(contest_id)
+    # The list of problems is rendered from the cache, under the content version of the
+    # contest, and is only queried when it is not cached
+    problems = Problem.objects.filter(contest_id=contest_id, deleted=False)
     curr_time = timezone.now()
     context = {
         'contest': contest,
         'type': 'Poster' if perm else 'Participant',
         'problems': problems,
-        'leaderboard_status': status,
-        'leaderboard': leaderboard,
         'curr_time': curr_time,
     }
+    context.update(_get_leaderboard_context(request, contest, user))
+    context.update(_status_poll_context())
     if perm is True:
         if request.method == 'POST':
             form = UpdateContestForm(request.POST)
@@ -265,13 +494,29 @@ def contest_detail(request, contest_id):
                 if (curr_time < contest.soft_end_datetime or
                     (form.cleaned_data['contest_soft_end'] == contest.soft_end_datetime and
                         curr_time < contest.hard_end_datetime)):
+                    deadlines_changed = (
+                        contest.soft_end_datetime != form.cleaned_data['contest_soft_end'] or
+                        contest.hard_end_datetime != form.cleaned_data['contest_hard_end'])
                     try:
                         contest.start_datetime = form.cleaned_data['contest_start']
                         contest.soft_end_datetime = form.cleaned_data['contest_soft_end']
                         contest.hard_end_datetime = form.cleaned_data['contest_hard_end']
-                        contest.save()
+                        # Only the dates are written, as the versions and the deleted flag
+                        # of the contest may have changed since it was read
+                        contest.save(update_fields=['start_datetime', 'soft_end_datetime',
+                                                    'hard_end_datetime'])
                     except Exception as e:
                         form.add_error(None, str(e))
+                    else:
+                        handler.bump_content_version(contest_id)
+                        handler.bump_contest_list_version()
+                        if deadlines_changed:
+                            # Late submissions have to be penalized as per the new deadlines
+                            status, maybe_error = handler.rescore_contest(contest_id)
+                            if not status:
+                                form.add_error(None, maybe_error)
+                        contest.refresh_from_db(fields=['scores_version', 'content_version'])
+                        context.update(_get_leaderboard_context(request, contest, user))
                 else:
                     form.add_error(None, 'Deadline cannot be extended if it has passed')
         else:
@@ -288,25 +533,127 @@ def contest_scores_csv(request, contest_id):
     """
     Function to provide the facility to download a CSV of scores
     of participants in a contest at a given point in time.
+    The scores of every problem are added as columns if the ``problems`` parameter is present.
 
     :param request: the request object used
     :type request: HttpRequest
     :param contest_id: the contest ID
     :type contest_id: int
     """
-    user = _get_user(request)
-    perm = handler.get_personcontest_permission(
-        None if user is None else user.email, contest_id)
+    perm = _get_contest_permission(request, contest_id)
     if perm:
-        status, csv_or_error = handler.get_csv(contest_id)
+        status, csv_or_error = handler.get_csv(contest_id,
+                                               per_problem='problems' in request.GET)
         if status:
-            response = HttpResponse(csv_or_error.read())
+            response = StreamingHttpResponse(csv_or_error, content_type='text/csv')
             response['Content-Disposition'] = \
                 "attachment; filename=contest_{}.csv".format(contest_id)
             return response
     return handler404(request)
 
 
+def contest_events(request, contest_id):
+    """
+    Stream of Server-Sent Events with the changes to the leaderboard of a contest.
+    Every ``leaderboard`` event has the list of persons whose scores changed, along with their
+    new scores. The ID of the event is the scores version of the contest, and changes after
+    the version in the ``version`` parameter (or the ``Last-Event-ID`` header while
+    reconnecting) are sent right away.
+
+    Every open stream holds a worker thread for up to ``events.STREAM_LIFETIME`` seconds,
+    after which the browser reconnects. The pages use :func:`contest_leaderboard_status`
+    instead, which does not hold a thread while waiting when served with ASGI.
+
+    :param request: the request object used
+    :type request: HttpRequest
+    :param contest_id: the contest ID
+    :type contest_id: int
+    """
+    perm = _get_contest_permission(request, contest_id)
+    if perm is None:
+        return handler404(request)
+    contest = get_object_or_404(Contest, pk=contest_id, deleted=False)
+    try:
+        since = int(request.META.get('HTTP_LAST_EVENT_ID', request.GET.get('version')))
+    except (TypeError, ValueError):
+        since = contest.scores_version
+
+    def catch_up():
+        if since >= contest.scores_version:
+            return []
+        version, changes = handler.get_leaderboard_changes(contest_id, since)
+        return [('leaderboard', version, changes)] if changes else []
+
+    return _event_stream_response(('contest', contest_id), contest.scores_version, catch_up)
+
+
+async def contest_leaderboard_status(request, contest_id):
+    """
+    Compact JSON of the changes to the leaderboard of a contest, for clients polling for them.
+    The response has the current scores ``version`` of the contest, and the list ``changes``
+    of the persons whose scores changed after the version in the ``version`` parameter, along
+    with their new scores, as given by :func:`~judge.handler.get_leaderboard_changes`.
+
+    With the ``wait`` parameter, a request for the current version is held for up to that
+    many seconds (at most ``STATUS_LONG_POLL_TIMEOUT``) until the scores change. This view is
+    async, so that the waiting requests do not hold a thread when served with ASGI.
+
+    :param request: the request object used
+    :type request: HttpRequest
+    :param contest_id: the contest ID
+    :type contest_id: int
+    """
+    def get_version():
+        if _get_contest_permission(request, contest_id) is None:
+            return None
+        return Contest.objects.filter(pk=contest_id, deleted=False).values_list(
+            'scores_version', flat=True).first()
+
+    version = await sync_to_async(get_version)()
+    if version is None:
+        return await sync_to_async(handler404)(request)
+    try:
+        since = int(request.GET['version'])
+    except (KeyError, ValueError):
+        since = version
+
+    wait = _long_poll_wait(request)
+    if wait > 0 and version <= since:
+        async def changed():
+            return (await sync_to_async(get_version)() or 0) > since
+
+        await events.hub.wait({('contest', contest_id): since}, wait, changed)
+
+    version, changes = await sync_to_async(handler.get_leaderboard_changes)(contest_id, since)
+    response = JsonResponse({'version': version, 'changes': changes if version > since else []})
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def contest_score_matrix(request, contest_id):
+    """
+    Renders the score matrix of a contest, which has the best score, the number of attempts
+    and the time of the best submission of every participant for every problem.
+
+    :param request: the request object used
+    :type request: HttpRequest
+    :param contest_id: the contest ID
+    :type contest_id: int
+    """
+    perm = _get_contest_permission(request, contest_id)
+    if perm is None:
+        return handler404(request)
+    status, matrix = handler.get_score_matrix(contest_id)
+    if not status:
+        return handler404(request)
+    context = {
+        'contest_id': contest_id,
+        'problems': matrix['problems'],
+        'rows': matrix['rows'],
+    }
+    return render(request, 'judge/contest_score_matrix.html', context)
+
+
 def delete_contest(request, contest_id):
     """
     Function to provide the option to delete a contest.
@@ -316,11 +663,9 @@ def delete_contest(request, contest_id):
     :param contest_id: the contest ID
     :type contest_id: int
     """
-    user = _get_user(request)
-    perm = handler.get_personcontest_permission(
-        None if user is None else user.email, contest_id)
+    perm = _get_contest_permission(request, contest_id)
     if perm and request.method == 'POST':
-        status, _ = handler.delete_contest(contest_id)
+        status, _ = handler.delete_contest(contest_id, background=True)
         if status:
             return redirect(reverse('judge:index'))
         else:
@@ -338,15 +683,13 @@ def delete_problem(request, problem_id):
     :param problem_id: the problem ID
     :type problem_id: str
     """
-    user = _get_user(request)
-    problem = get_object_or_404(Problem, pk=problem_id)
+    problem = get_object_or_404(Problem, pk=problem_id, deleted=False)
     contest_id = problem.contest.pk
-    perm = handler.get_personproblem_permission(
-        None if user is None else user.email, problem_id)
+    perm = _get_problem_permission(request, problem_id)
     if timezone.now() > problem.contest.start_datetime:
         return handler404(request)
     if perm and request.method == 'POST':
-        status, _ = handler.delete_problem(problem_id)
+        status, _ = handler.delete_problem(problem_id, background=True)
         if status:
             return redirect(reverse('judge:contest_detail', args=(contest_id,)))
         else:
@@ -355,6 +698,27 @@ def delete_problem(request, problem_id):
         return handler404(request)
 
 
+def rejudge_problem(request, problem_id):
+    """
+    Function to provide the option to rejudge all the submissions of a problem.
+
+    :param request: the request object used
+    :type request: HttpRequest
+    :param problem_id: the problem ID
+    :type problem_id: str
+    """
+    get_object_or_404(Problem, pk=problem_id, deleted=False)
+    perm = _get_problem_permission(request, problem_id)
+    if perm and request.method == 'POST':
+        status, _ = handler.rejudge_problem(problem_id)
+        if status:
+            return redirect(reverse('judge:problem_detail', args=(problem_id,)))
+        else:
+            return handler404(request)
+    else:
+        return handler404(request)
+
+
 def delete_testcase(request, problem_id, testcase_id):
     """
     Function to provide the option to delete a test-case of a particular problem.
@@ -366,12 +730,8 @@ def delete_testcase(request, problem_id, testcase_id):
     :param testcase_id: the testcase ID
     :type testcase_id: str
     """
-    user = _get_user(request)
-    perm = handler.get_personproblem_permission(
-        None if user is None else user.email, problem_id)
+    perm = _get_problem_permission(request, problem_id)
     testcase = get_object_or_404(TestCase, pk=testcase_id)
-    if timezone.now() > testcase.problem.contest.start_datetime:
-        return handler404(request)
     if problem_id == testcase.problem.pk and perm and request.method == 'POST':
         status, _ = handler.delete_testcase(testcase_id)
         if status:
@@ -392,14 +752,12 @@ def problem_detail(request, problem_id):
     :param problem_id: the problem ID
     :type problem_id: str
     """
-    problem = get_object_or_404(Problem, pk=problem_id)
+    problem = get_object_or_404(Problem.objects.select_related('contest'),
+                                pk=problem_id, deleted=False)
     user = _get_user(request)
-    perm = handler.get_personproblem_permission(
-        None if user is None else user.email, problem_id)
+    perm = _get_problem_permission(request, problem_id)
     if perm is None:
         return handler404(request)
-    public_tests = TestCase.objects.filter(problem_id=problem_id, public=True)
-    private_tests = TestCase.objects.filter(problem_id=problem_id, public=False)
     context = {
         'problem': problem,
         'type': 'Poster' if perm else 'Participant',
@@ -420,34 +778,41 @@ def problem_detail(request, problem_id):
             form = NewSubmissionForm()
         context['form'] = form
     if perm is True:
-        if timezone.now() < problem.contest.start_datetime:
-            if request.method == 'POST':
-                form = AddTestCaseForm(request.POST, request.FILES)
-                if form.is_valid():
-                    status, maybe_error = handler.process_testcase(problem_id, **form.cleaned_data)
-                    if status:
-                        redirect(reverse('judge:problem_submissions', args=(problem_id,)))
-                    else:
-                        form.add_error(None, maybe_error)
-            else:
-                form = AddTestCaseForm()
-        else:
-            form = None
+        # Testcases can be changed even after the contest has started, as the
+        # submissions are rejudged on the new testcases and rescored
+        form = AddTestCaseForm()
+        archive_form = AddTestCaseArchiveForm()
+        if request.method == 'POST' and 'upload_archive' in request.POST:
+            archive_form = AddTestCaseArchiveForm(request.POST, request.FILES)
+            if archive_form.is_valid():
+                status, maybe_error = handler.process_testcase_archive(
+                    problem_id, archive_form.cleaned_data['archive'])
+                if status:
+                    return redirect(reverse('judge:problem_detail', args=(problem_id,)))
+                else:
+                    archive_form.add_error(None, maybe_error)
+        elif request.method == 'POST':
+            form = AddTestCaseForm(request.POST, request.FILES)
+            if form.is_valid():
+                status, maybe_error = handler.process_testcase(problem_id, **form.cleaned_data)
+                if status:
+                    return redirect(reverse('judge:problem_detail', args=(problem_id,)))
+                else:
+                    form.add_error(None, maybe_error)
         context['form'] = form
-    context['public_tests'] = []
-    context['private_tests'] = []
-    for t in public_tests:
-        input_file = open(t.inputfile.path, 'r')
-        output_file = open(t.outputfile.path, 'r')
-        context['public_tests'].append((input_file.read(), output_file.read(), t.pk))
-        input_file.close()
-        output_file.close()
-    for t in private_tests:
-        input_file = open(t.inputfile.path, 'r')
-        output_file = open(t.outputfile.path, 'r')
-        context['private_tests'].append((input_file.read(), output_file.read(), t.pk))
-        input_file.close()
-        output_file.close()
+        context['archive_form'] = archive_form
+        context['rejudge_pending'] = handler.get_rejudge_progress(problem_id)
+    # Only the previews are shown, the full files are downloaded with testcase_download.
+    # They are cached under the content version of the contest, which changes with any
+    # test case of its problems.
+    public_tests, private_tests = cache.get_or_set(
+        'problem_tests_{}_{}'.format(problem_id, problem.contest.content_version),
+        lambda: tuple(list(TestCase.objects.filter(problem_id=problem_id, public=public)
+                           .values_list('input_preview', 'output_preview', 'pk'))
+                      for public in (True, False)),
+        FRAGMENT_CACHE_TIMEOUT)
+    context['public_tests'] = public_tests
+    context['private_tests'] = private_tests if perm is True else []
     context['curr_time'] = timezone.now()
     return render(request, 'judge/problem_detail.html', context)
 
@@ -462,13 +827,12 @@ def problem_starting_code(request, problem_id: str):
     :param problem_id: the problem ID
     :type problem_id: str
     """
-    problem = get_object_or_404(Problem, pk=problem_id)
-    user = _get_user(request)
-    perm = handler.get_personproblem_permission(None if user is None else user.email, problem_id)
+    problem = get_object_or_404(Problem, pk=problem_id, deleted=False)
+    perm = _get_problem_permission(request, problem_id)
     if perm is None:
         return handler404(request)
     elif problem.starting_code:
-        return _return_file_as_response(problem.starting_code.path)
+        return _return_file_as_response(request, problem.starting_code.path)
     else:
         return handler404(request)
 
@@ -483,13 +847,12 @@ def problem_compilation_script(request, problem_id: str):
     :param problem_id: the problem ID
     :type problem_id: str
     """
-    problem = get_object_or_404(Problem, pk=problem_id)
-    user = _get_user(request)
-    perm = handler.get_personproblem_permission(None if user is None else user.email, problem_id)
+    problem = get_object_or_404(Problem, pk=problem_id, deleted=False)
+    perm = _get_problem_permission(request, problem_id)
     if perm is None or not perm:
         return handler404(request)
     elif problem.compilation_script:
-        return _return_file_as_response(problem.compilation_script.path)
+        return _return_file_as_response(request, problem.compilation_script.path)
     else:
         return handler404(request)
 
@@ -504,13 +867,12 @@ def problem_test_script(request, problem_id: str):
     :param problem_id: the problem ID
     :type problem_id: str
     """
-    problem = get_object_or_404(Problem, pk=problem_id)
-    user = _get_user(request)
-    perm = handler.get_personproblem_permission(None if user is None else user.email, problem_id)
+    problem = get_object_or_404(Problem, pk=problem_id, deleted=False)
+    perm = _get_problem_permission(request, problem_id)
     if perm is None or not perm:
         return handler404(request)
     elif problem.test_script:
-        return _return_file_as_response(problem.test_script.path)
+        return _return_file_as_response(request, problem.test_script.path)
     else:
         return handler404(request)
 
@@ -528,7 +890,8 @@ def problem_default_script(request, script_name: str):
     if script_name not in ['compilation_script', 'test_script']:
         return handler404(request)
     else:
-        return _return_file_as_response(os.path.join('judge', 'default', script_name + '.sh'))
+        return _return_file_as_response(request, os.path.join('judge', 'default',
+                                                              script_name + '.sh'))
 
 
 def new_problem(request, contest_id):
@@ -540,10 +903,8 @@ def new_problem(request, contest_id):
     :param contest_id: the contest ID
     :type contest_id: int
     """
-    contest = get_object_or_404(Contest, pk=contest_id)
-    user = _get_user(request)
-    perm = handler.get_personcontest_permission(
-        None if user is None else user.email, contest_id)
+    contest = get_object_or_404(Contest, pk=contest_id, deleted=False)
+    perm = _get_contest_permission(request, contest_id)
     if not (perm is True):
         return handler404(request)
     context = {'contest': contest}
@@ -574,11 +935,9 @@ def edit_problem(request, problem_id):
     :param problem_id: the problem ID
     :type problem_id: str
     """
-    problem = get_object_or_404(Problem, pk=problem_id)
+    problem = get_object_or_404(Problem, pk=problem_id, deleted=False)
     contest = get_object_or_404(Contest, pk=problem.contest_id)
-    user = _get_user(request)
-    perm = handler.get_personcontest_permission(
-        None if user is None else user.email, contest.pk)
+    perm = _get_contest_permission(request, contest.pk)
     if not (perm is True):
         return handler404(request)
     context = {'contest': contest}
@@ -601,7 +960,8 @@ def edit_problem(request, problem_id):
 def problem_submissions(request, problem_id: str):
     """
     Renders the page where all submissions to a given problem can be seen.
-    For posters, this renders a set of tables for each participant.
+    For posters, this renders a set of tables for each participant, a page of participants
+    at a time. The page starts after the participant in the ``after`` parameter.
     For participants, this renders a table with the scores of their submissions only.
 
     :param request: the request object used
@@ -610,11 +970,10 @@ def problem_submissions(request, problem_id: str):
     :type problem_id: str
     """
     user = _get_user(request)
-    perm = handler.get_personproblem_permission(
-        None if user is None else user.email, problem_id)
+    perm = _get_problem_permission(request, problem_id)
     if perm is None:
         return handler404(request)
-    problem = get_object_or_404(Problem, pk=problem_id)
+    problem = get_object_or_404(Problem, pk=problem_id, deleted=False)
     context = {'problem': problem, 'perm': perm}
     if request.method == 'POST':
         form = NewCommentForm(request.POST)
@@ -633,12 +992,18 @@ def problem_submissions(request, problem_id: str):
         form = NewCommentForm()
     submissions = {}
     if perm:
-        status, all_subs_or_error = handler.get_submissions(problem_id, None)
+        after = request.GET.get('after')
+        status, all_subs_or_error = handler.get_submissions(problem_id, None, after=after,
+                                                            limit=SUBMISSIONS_PAGE_SIZE)
         if status:
+            comment_sets = handler.get_comments_of_persons(problem_id,
+                                                           list(all_subs_or_error))
             for email, subs in all_subs_or_error.items():
-                comment_set = handler.get_comments(problem_id, email)
-                submissions[email] = (subs, comment_set)
+                submissions[email] = (subs, comment_sets[email])
             context['submissions'] = submissions
+            context['after'] = after
+            if len(all_subs_or_error) == SUBMISSIONS_PAGE_SIZE:
+                context['next_after'] = list(all_subs_or_error)[-1]
         else:
             return handler404(request)
     elif user is not None:
@@ -667,16 +1032,39 @@ def submission_download(request, submission_id: str):
     """
     user = _get_user(request)
     submission = get_object_or_404(Submission, pk=submission_id)
-    perm = handler.get_personproblem_permission(
-        None if user is None else user.email, submission.problem.pk)
+    perm = _get_problem_permission(request, submission.problem.pk)
     if user is None:
         return handler404(request)
     if perm or user.email == submission.participant.pk:
-        return _return_file_as_response(submission.submission_file.path)
+        return _return_file_as_response(request, submission.submission_file.path)
     else:
         return handler404(request)
 
 
+def testcase_download(request, problem_id: str, testcase_id: str, kind: str):
+    """
+    Function to provide the facility to download the input or the output file of a
+    test case. Public test cases can be downloaded by everyone who can see the problem,
+    and private test cases only by the posters.
+
+    :param request: the request object used
+    :type request: HttpRequest
+    :param problem_id: the problem ID
+    :type problem_id: str
+    :param testcase_id: the testcase ID
+    :type testcase_id: str
+    :param kind: one of ``input`` or ``output``
+    :type kind: str
+    """
+    testcase = get_object_or_404(TestCase, pk=testcase_id, problem=problem_id,
+                                 problem__deleted=False)
+    perm = _get_problem_permission(request, problem_id)
+    if perm is None or (not testcase.public and not perm) or kind not in ('input', 'output'):
+        return handler404(request)
+    path = testcase.inputfile.path if kind == 'input' else testcase.outputfile.path
+    return _return_file_as_response(request, path, '{}_{}.txt'.format(kind, testcase_id))
+
+
 def submission_detail(request, submission_id: str):
     """
     Renders the page where a detailed breakdown with respect to judge's
@@ -689,8 +1077,7 @@ def submission_detail(request, submission_id: str):
     """
     user = _get_user(request)
     submission = get_object_or_404(Submission, pk=submission_id)
-    perm = handler.get_personproblem_permission(
-        None if user is None else user.email, submission.problem.pk)
+    perm = _get_problem_permission(request, submission.problem.pk)
     context = {'submission': submission, 'problem': submission.problem}
     if user is None:
         return handler404(request)
@@ -716,9 +1103,105 @@ def submission_detail(request, submission_id: str):
             context['final_score'] = info_or_error[1][3]
             context['timestamp'] = info_or_error[1][4]
             context['file_type'] = info_or_error[1][5]
+            # The verdicts are only polled for on the page while the submission is judged
+            context['running'] = any(res[0] == 'Running' for res in info_or_error[0].values())
+            context.update(_status_poll_context())
         else:
             return handler404(request)
 
         return render(request, 'judge/submission_detail.html', context)
     else:
         return handler404(request)
+
+
+def submission_events(request, submission_id: str):
+    """
+    Stream of Server-Sent Events with the changes to the verdicts and scores of a submission.
+    Every ``verdict`` event has the current status of the submission, as given by
+    :func:`~judge.handler.get_submission_verdicts`.
+
+    Every open stream holds a worker thread for up to ``events.STREAM_LIFETIME`` seconds,
+    after which the browser reconnects. The pages use :func:`submission_status` instead,
+    which does not hold a thread while waiting when served with ASGI.
+
+    :param request: the request object used
+    :type request: HttpRequest
+    :param submission_id: the submission ID
+    :type submission_id: str
+    """
+    user = _get_user(request)
+    submission = get_object_or_404(Submission, pk=submission_id)
+    if user is None:
+        return handler404(request)
+    perm = _get_problem_permission(request, submission.problem_id)
+    if not perm and user.email != submission.participant_id:
+        return handler404(request)
+    status = handler.get_submission_verdicts([submission.pk]).get(submission.pk)
+    return _event_stream_response(('submission', submission.pk), status,
+                                  lambda: [('verdict', None, status)])
+
+
+async def submission_status(request, submission_id: str):
+    """
+    Compact JSON status of a submission, for clients polling for its verdicts.
+    The response has a list ``submissions`` with the submission as its only element, in the
+    format of :func:`~judge.handler.get_submission_verdicts` along with its ``id``.
+
+    The ETag of the response changes with the version of the submission, so a request with
+    an unchanged ``If-None-Match`` header gets an empty 304 response. With the ``wait``
+    parameter, such a request is held for up to that many seconds (at most
+    ``STATUS_LONG_POLL_TIMEOUT``) until the submission changes. This view is async, so
+    that the waiting requests do not hold a thread when served with ASGI.
+
+    :param request: the request object used
+    :type request: HttpRequest
+    :param submission_id: the submission ID
+    :type submission_id: str
+    """
+    def can_view():
+        user = _get_user(request)
+        submission = Submission.objects.filter(pk=submission_id).values(
+            'problem', 'participant').first()
+        if user is None or submission is None:
+            return False
+        perm = _get_problem_permission(request, submission['problem'])
+        return perm is not None and (perm or user.email == submission['participant'])
+
+    if not await sync_to_async(can_view)():
+        return await sync_to_async(handler404)(request)
+
+    def get_versions():
+        return list(Submission.objects.filter(pk=submission_id).values_list('pk', 'version'))
+
+    return await _status_response(request, get_versions, _submissions_status_payload)
+
+
+async def problem_submissions_status(request, problem_id: str):
+    """
+    Compact JSON status of the submissions made by the user to a problem, in the order in
+    which they were made. The response is the same as that of :func:`submission_status`,
+    with all the submissions of the user in ``submissions``. A request with an unchanged
+    ``If-None-Match`` header gets an empty 304 response, and can wait for a change in the
+    same way. New submissions change the ETag as well.
+
+    :param request: the request object used
+    :type request: HttpRequest
+    :param problem_id: the problem ID
+    :type problem_id: str
+    """
+    def get_email():
+        user = _get_user(request)
+        if user is None or _get_problem_permission(request, problem_id) is None:
+            return None
+        return user.email
+
+    email = await sync_to_async(get_email)()
+    if email is None:
+        return await sync_to_async(handler404)(request)
+
+    def get_versions():
+        return list(Submission.objects.filter(
+            problem=problem_id, participant=email).order_by(
+                'timestamp', 'pk').values_list('pk', 'version'))
+
+    return await _status_response(request, get_versions, _submissions_status_payload)
@@ -2,10 +2,17 @@ import os
 import django
 
 from time import sleep
-from subprocess import call
-from typing import List
+from hashlib import sha256
+from threading import Lock, Thread
+from subprocess import call, Popen
+from typing import Optional, Set, Tuple
 from datetime import timedelta
+from traceback import print_exc
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pycodestyle import Checker
+from django.db import transaction, connection
+from django.db.models import Max
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "autojudge.settings")
@@ -18,153 +25,348 @@ TMP_DIRECTORY = 'tmp'
 MONITOR_DIRECTORY = os.path.join(CONTENT_DIRECTORY, TMP_DIRECTORY)
 DOCKER_IMAGE_NAME = 'autojudge_docker'
 
-LS: List[str] = []
-# Re-check the status of the submission folder if the number of unscored submissions
-# is less than REFRESH_LS_TRIGGER
-REFRESH_LS_TRIGGER = 5
-# Sleep duration if number of unscored submissions is less than REFRESH_LS_TRIGGER
+# Sleep duration before checking the submission folder again if there is no job to run
 SLEEP_DUR_BEFORE_REFRESH = 10
+# Interval at which verdicts of a running submission are saved
+STREAM_POLL_INTERVAL = 1
+
+# The live lane judges new submissions. Rejudges of existing submissions, both on new
+# testcases and of whole problems, run in a separate lane, with at most BULK_REJUDGE_WORKERS
+# containers at a time. The lane waits while more than BULK_REJUDGE_MAX_LIVE_BACKLOG
+# new submissions are waiting to be judged, so that it never delays live judging.
+LIVE_JOB_PREFIXES = ('sub_run_',)
+BULK_JOB_PREFIXES = ('sub_rejudge_', 'sub_bulk_')
+BULK_REJUDGE_WORKERS = 1
+BULK_REJUDGE_MAX_LIVE_BACKLOG = 0
+# Submissions being judged by any lane; a submission is judged by one lane at a time,
+# as the runs of a submission share their log and output files
+RUNNING: Set[str] = set()
+RUNNING_LOCK = Lock()
+
+# Linting is done by a separate pool of workers so that it does not delay judging
+LINTER_WORKERS = 2
+LINTER_POOL = ThreadPoolExecutor(max_workers=LINTER_WORKERS)
+# Linter scores of recently linted files, keyed by the SHA-256 of their source
+LINTER_CACHE: 'OrderedDict[str, float]' = OrderedDict()
+LINTER_CACHE_SIZE = 4096
+LINTER_CACHE_LOCK = Lock()
 
 
 def _compute_lint_score(report):
     if len(report.lines) > 0:
         score = 10.0 * (1 - report.total_errors / len(report.lines))
         return max(0.0, score)
-
-
-def saver(sub_id):
-    update_lb = False
-    # Based on the result populate SubmsissionTestCase table and return the result
-    with open(os.path.join(MONITOR_DIRECTORY, 'sub_run_' + sub_id + '.txt'), 'r') as f:
-        # Assumed format to sub_run_ID.txt file
-        # PROBLEM_CODE
-        # SUBMISSION_ID
-        # TESTCASEID VERDICT TIME MEMORY MESSAGE
-        # Read the output into verdict, memory and time.
-        lines = [line[:-1] for line in f.readlines()]
-        problem = lines[0]
-        submission = lines[1]
-        testcase_id, verdict, time, memory, msg = [], [], [], [], []
-        for line in lines[2:]:
-            sep = line.split(' ', maxsplit=4)
-            testcase_id.append(sep[0])
-            verdict.append(sep[1])
-            time.append(sep[2])
-            memory.append(sep[3])
-            with open(os.path.join(MONITOR_DIRECTORY, sep[4])) as log_file:
-                msg.append(str(log_file.read()))
-            os.remove(os.path.join(MONITOR_DIRECTORY, sep[4]))  # Remove after reading
-
-    # Delete the file after reading
-    os.remove(os.path.join(MONITOR_DIRECTORY, 'sub_run_' + sub_id + '.txt'))
-
-    problem = models.Problem.objects.get(pk=problem)
-    s = models.Submission.objects.get(pk=submission)
-
-    score_received = 0
-    max_score = problem.max_score
-    for i in range(len(testcase_id)):
-        if verdict[i] == 'P':
-            score_received += max_score
-        st = models.SubmissionTestCase.objects.get(submission=submission,
-                                                   testcase=testcase_id[i])
-        st.verdict = verdict[i]
-        st.memory_taken = int(memory[i])
-        st.time_taken = timedelta(seconds=float(time[i]))
-        if models.TestCase.objects.get(pk=testcase_id[i]).public:
-            st.message = msg[i] if len(msg[i]) < 1000 else msg[i][:1000] + '\\nMessage Truncated'
-        st.save()
-
-    s.judge_score = score_received
-
-    if s.problem.contest.enable_linter_score:
-        if s.file_type == '.py':
-            checker = Checker(
-                        os.path.join(CONTENT_DIRECTORY,
-                                     'submissions', 'submission_{}.py'.format(submission)),
-                        quiet=True)
+    return 0.0
+
+
+def _lint_submission(sub_id, sub_path):
+    try:
+        with open(sub_path, 'rb') as f:
+            source_hash = sha256(f.read()).hexdigest()
+        with LINTER_CACHE_LOCK:
+            score = LINTER_CACHE.get(source_hash)
+            if score is not None:
+                LINTER_CACHE.move_to_end(source_hash)
+        if score is None:
+            checker = Checker(sub_path, quiet=True)
             checker.check_all()
-            s.linter_score = _compute_lint_score(checker.report)
-    current_final_score = s.judge_score + s.poster_score + s.linter_score
-
-    penalty_multiplier = 1.0
-    # If the submission crosses soft deadline
-    # Check if the submission has crossed the hard deadline
-    # If yes, penalty_multiplier = 0
-    # Else, penality_multiplier = 1 - num_of_days * penalty
-    remaining_time = problem.contest.soft_end_datetime - s.timestamp
-    if s.timestamp > problem.contest.soft_end_datetime:
-        if s.timestamp > problem.contest.hard_end_datetime:
-            penalty_multiplier = 0.0
+            score = _compute_lint_score(checker.report)
+            with LINTER_CACHE_LOCK:
+                LINTER_CACHE[source_hash] = score
+                if len(LINTER_CACHE) > LINTER_CACHE_SIZE:
+                    LINTER_CACHE.popitem(last=False)
+        # This updates the final score, and the leaderboard if required
+        handler.update_linter_score(sub_id, score)
+    except Exception:
+        print_exc()
+    finally:
+        # Every worker thread holds its own database connection
+        connection.close()
+
+
+def _job_name(sub_id, job_name=None):
+    # The first run of a submission is the job sub_run_ID, and every rejudge of the
+    # submission on new testcases is a job sub_rejudge_ID_TOKEN
+    return job_name or 'sub_run_' + sub_id
+
+
+def _read_results(job_name):
+    # Assumed format to sub_run_ID.result (or sub_rejudge_ID_TOKEN.result) file
+    # TESTCASEID VERDICT TIME MEMORY LOGFILE
+    # Read the output into a dictionary keyed by the testcase ID.
+    # While the submission is still being evaluated, this file could be missing or could
+    # have a partially written line. Such lines are skipped.
+    try:
+        with open(os.path.join(MONITOR_DIRECTORY, job_name + '.result'), 'r') as f:
+            lines = [line[:-1] for line in f.readlines() if line.endswith('\n')]
+    except FileNotFoundError:
+        return {}
+    results = {}
+    for line in lines:
+        sep = line.split(' ', maxsplit=4)
+        if len(sep) == 5:
+            testcase_id, verdict, time, memory, log_file = sep
+            results[testcase_id] = (verdict, time, memory, log_file)
+    return results
+
+
+def _apply_results(sts, results):
+    # Apply the verdicts to the SubmissionTestCase rows in memory, and return the updated rows
+    updated_sts = []
+    for st in sts:
+        if st.testcase_id in results:
+            verdict, time, memory, log_file = results[st.testcase_id]
+            st.verdict = verdict
+            st.memory_taken = int(memory)
+            st.time_taken = timedelta(seconds=float(time))
+            # Messages are shown only for public testcases, so skip reading the rest
+            if st.testcase.public:
+                with open(os.path.join(MONITOR_DIRECTORY, log_file)) as log:
+                    msg = log.read()
+                st.message = msg if len(msg) < 1000 else msg[:1000] + '\\nMessage Truncated'
+            updated_sts.append(st)
+
+    # Remove the log files after reading
+    for _, _, _, log_file in results.values():
+        log_path = os.path.join(MONITOR_DIRECTORY, log_file)
+        if os.path.exists(log_path):
+            os.remove(log_path)
+    return updated_sts
+
+
+def stream_saver(sub_id, applied, job_name=None):
+    # Save the verdicts of the testcases that have finished since the last call,
+    # so that they are visible while the rest of the testcases are running
+    results = {testcase_id: result
+               for testcase_id, result in _read_results(_job_name(sub_id, job_name)).items()
+               if testcase_id not in applied}
+    if len(results) == 0:
+        return
+    sts = models.SubmissionTestCase.objects.filter(
+        submission=sub_id, testcase__in=list(results.keys())).select_related('testcase')
+    updated_sts = _apply_results(sts, results)
+    models.SubmissionTestCase.objects.bulk_update(
+        updated_sts, ['verdict', 'memory_taken', 'time_taken', 'message'])
+    applied.update(results.keys())
+    handler.invalidate_submission_status([sub_id])
+
+
+def saver(sub_id, applied=frozenset(), job_name=None, rescore=False):
+    # Based on the result populate SubmsissionTestCase table and return the result
+    # Verdicts that have already been saved by stream_saver are skipped
+    # If rescore is True, then the best score of the participant is recomputed, as the
+    # score of a rejudged submission can decrease as well
+    job_name = _job_name(sub_id, job_name)
+    results = {testcase_id: result for testcase_id, result in _read_results(job_name).items()
+               if testcase_id not in applied}
+
+    # Delete the job and its results after reading. The job is gone already if the problem
+    # of the submission has been deleted while judging.
+    handler._check_and_remove(os.path.join(MONITOR_DIRECTORY, job_name + '.txt'),
+                              os.path.join(MONITOR_DIRECTORY, job_name + '.result'))
+
+    s = models.Submission.objects.select_related('problem__contest').filter(pk=sub_id).first()
+    if s is None:
+        # The problem or the contest has been deleted while judging
+        return False
+    problem = s.problem
+    contest = problem.contest
+
+    # Fetch all the rows of this submission in one query, and apply the verdicts in memory.
+    # The judge score is computed over all the rows, and not only the ones in this run.
+    sts = list(models.SubmissionTestCase.objects.filter(
+        submission=s).select_related('testcase'))
+    updated_sts = _apply_results(sts, results)
+    score_received = problem.max_score * sum(1 for st in sts if st.verdict == 'P')
+
+    # All the writes for this submission are committed together
+    with transaction.atomic():
+        models.SubmissionTestCase.objects.bulk_update(
+            updated_sts, ['verdict', 'memory_taken', 'time_taken', 'message'])
+        # The final score is computed from the stored linter and poster scores, which may
+        # have changed since the submission was read
+        s.final_score = handler.update_submission_scores(s.pk, contest,
+                                                         judge_score=score_received)
+
+        ppf, _ = models.PersonProblemFinalScore.objects.select_for_update().get_or_create(
+            person_id=s.participant_id, problem=problem)
+        if rescore:
+            old_highscore = ppf.score
+            ppf.score = models.Submission.objects.filter(
+                problem=problem, participant=s.participant_id).aggregate(
+                    best=Max('final_score'))['best']
+            ppf.save()
+            handler.update_leaderboard(contest.pk, s.participant_id,
+                                       ppf.score - old_highscore)
+        elif ppf.score <= s.final_score:
+            # <= because otherwise when someone submits for the first time and scores 0
+            # (s)he will not show up in leaderboard
+            old_highscore = ppf.score
+            ppf.score = s.final_score
+            ppf.save()
+            # Update the leaderboard only if the submission improved the final score
+            handler.update_leaderboard(contest.pk, s.participant_id,
+                                       ppf.score - old_highscore)
         else:
-            penalty_multiplier += remaining_time.days * problem.contest.penalty
-
-    # If num_of_days * penalty > 1.0, then the score is clamped to zero
-    s.final_score = max(0.0, current_final_score * penalty_multiplier)
-    s.save()
+            # The number of attempts has changed even if the score has not
+            handler.bump_scores_version(contest.pk)
 
-    ppf, _ = models.PersonProblemFinalScore.objects.get_or_create(person=s.participant,
-                                                                  problem=problem)
-    if ppf.score <= s.final_score:
-        # <= because otherwise when someone submits for the first time and scores 0
-        # (s)he will not show up in leaderboard
-        ppf.score = s.final_score
-        update_lb = True
-    ppf.save()
+    handler.invalidate_submission_status([sub_id])
 
-    if update_lb:
-        # Update the leaderboard only if the submission improved the final score
-        handler.update_leaderboard(problem.contest.pk, s.participant.email)
+    if contest.enable_linter_score and s.file_type == '.py':
+        # The linter score is added to the final score once the linter workers are done
+        LINTER_POOL.submit(_lint_submission, sub_id,
+                           os.path.join(CONTENT_DIRECTORY, 'submissions',
+                                        'submission_{}.py'.format(sub_id)))
 
     return True
 
 
-# Move to ./content
-cur_path = os.getcwd()
-os.chdir(os.path.join(cur_path, CONTENT_DIRECTORY))
-
-out = 1
-while out != 0:
-    print("Building Docker image: {}....".format(DOCKER_IMAGE_NAME))
-    # Build docker image using docker run
-    out = call(['docker', 'build', '-t', DOCKER_IMAGE_NAME, './'])
-    if out != 0:
-        print("Build failed, retrying...")
-
-# Move back to old directory
-os.chdir(cur_path)
-
-print("Docker image: {} built successfully!".format(DOCKER_IMAGE_NAME))
-
-
-if not os.path.exists(MONITOR_DIRECTORY):
-    os.makedirs(MONITOR_DIRECTORY)
-
-
-while True:
-    if len(LS) < REFRESH_LS_TRIGGER:
-        # Neglect .log files in tmp/; these are for error
-        # messages arising at any stage of the evaluation
-        sleep(SLEEP_DUR_BEFORE_REFRESH)
-        LS = [os.path.join(MONITOR_DIRECTORY, sub_file)
-              for sub_file in os.listdir(MONITOR_DIRECTORY) if sub_file[:-4] != '.log']
-        LS.sort(key=os.path.getctime)
-
-    if len(LS) > 0:
-        sub_file = LS[0]  # The first file submission-wise
-        sub_id = os.path.basename(sub_file)[8:-4]  # This is the submission ID
-
-        # Move to content
-        cur_dir = os.getcwd()
-        os.chdir(os.path.join(cur_dir, CONTENT_DIRECTORY))
-
+def _list_jobs(prefixes):
+    # Only pick the job files in tmp/; the .log files are for error messages arising at
+    # any stage of the evaluation, the .result files have the verdicts of the jobs, and
+    # the .part files are job files still being written
+    jobs = []
+    for sub_file in os.listdir(MONITOR_DIRECTORY):
+        if sub_file.startswith(prefixes) and sub_file.endswith('.txt'):
+            sub_path = os.path.join(MONITOR_DIRECTORY, sub_file)
+            try:
+                jobs.append((os.path.getctime(sub_path), sub_path))
+            except FileNotFoundError:
+                # The job has been removed after listing, as the submission has been deleted
+                continue
+    jobs.sort()
+    return [sub_path for _, sub_path in jobs]
+
+
+def _running_marker(sub_id):
+    # The web server skips the job files of the submissions marked by this file while
+    # deleting them, as the job files are in use by their containers
+    return os.path.join(MONITOR_DIRECTORY, 'running_{}'.format(sub_id))
+
+
+def _claim(sub_file) -> Optional[str]:
+    # Mark the submission of a job as running, and return its ID if it was not running
+    sub_id = os.path.basename(sub_file)[:-4].split('_')[2]  # This is the submission ID
+    with RUNNING_LOCK:
+        if sub_id in RUNNING:
+            return None
+        RUNNING.add(sub_id)
+    open(_running_marker(sub_id), 'w').close()
+    return sub_id
+
+
+def _next_job(prefixes) -> Optional[Tuple[str, str]]:
+    # Claim the oldest job of a lane whose submission is not being judged by the other lane,
+    # and return its file and its submission ID
+    for sub_file in _list_jobs(prefixes):
+        sub_id = _claim(sub_file)
+        if sub_id is not None:
+            return sub_file, sub_id
+    return None
+
+
+def run_job(sub_file, sub_id, stream=True, rescore=False):
+    # Run a job in a container, and save its verdicts
+    job_name = os.path.basename(sub_file)[:-4]
+    try:
         # Run docker image
-        print("INFO: evaluating submission: {}".format(sub_id))
-        call(['docker', 'run', '--rm', '-v', '{}:/app'.format(os.getcwd()),
-              '-e', 'SUB_ID={}'.format(sub_id), DOCKER_IMAGE_NAME])
-
-        # Come back to parent directory
-        os.chdir(cur_dir)
-
-        saver(sub_id)
-        LS.remove(sub_file)
+        print("INFO: evaluating submission: {} ({})".format(sub_id, job_name))
+        process = Popen(['docker', 'run', '--rm',
+                         '-v', '{}:/app'.format(os.path.abspath(CONTENT_DIRECTORY)),
+                         '-e', 'JOB_NAME={}'.format(job_name), DOCKER_IMAGE_NAME])
+
+        # Save the verdicts of the testcases as and when they are evaluated
+        applied = set()
+        while process.poll() is None:
+            sleep(STREAM_POLL_INTERVAL)
+            if stream:
+                stream_saver(sub_id, applied, job_name)
+
+        saver(sub_id, applied, job_name, rescore=rescore)
+    finally:
+        handler._check_and_remove(_running_marker(sub_id))
+        with RUNNING_LOCK:
+            RUNNING.discard(sub_id)
+
+
+def _run_claimed(sub_file, sub_id, stream=True, rescore=False):
+    # Run a claimed job, unless it has been removed as the submission has been deleted
+    if os.path.exists(sub_file):
+        run_job(sub_file, sub_id, stream=stream, rescore=rescore)
+    else:
+        handler._check_and_remove(_running_marker(sub_id))
+        with RUNNING_LOCK:
+            RUNNING.discard(sub_id)
+
+
+def _bulk_rejudge_worker():
+    # The verdicts of a bulk rejudge are not streamed, so that the verdicts and the score
+    # of every submission change together. The verdicts of a rejudge on new testcases are
+    # streamed as in the live lane. The queued job files are the checkpoint of the
+    # rejudges, and the remaining ones are picked up again after a restart.
+    while True:
+        try:
+            claimed = None
+            if len(_list_jobs(LIVE_JOB_PREFIXES)) <= BULK_REJUDGE_MAX_LIVE_BACKLOG:
+                claimed = _next_job(BULK_JOB_PREFIXES)
+            if claimed is None:
+                sleep(SLEEP_DUR_BEFORE_REFRESH)
+                continue
+            sub_file, sub_id = claimed
+            bulk = os.path.basename(sub_file).startswith('sub_bulk_')
+            _run_claimed(sub_file, sub_id, stream=not bulk, rescore=bulk)
+        except Exception:
+            print_exc()
+        finally:
+            # Every worker thread holds its own database connection
+            connection.close()
+
+
+def main():
+    # Move to ./content
+    cur_path = os.getcwd()
+    os.chdir(os.path.join(cur_path, CONTENT_DIRECTORY))
+
+    out = 1
+    while out != 0:
+        print("Building Docker image: {}....".format(DOCKER_IMAGE_NAME))
+        # Build docker image using docker run
+        out = call(['docker', 'build', '-t', DOCKER_IMAGE_NAME, './'])
+        if out != 0:
+            print("Build failed, retrying...")
+
+    # Move back to old directory
+    os.chdir(cur_path)
+
+    print("Docker image: {} built successfully!".format(DOCKER_IMAGE_NAME))
+
+    if not os.path.exists(MONITOR_DIRECTORY):
+        os.makedirs(MONITOR_DIRECTORY)
+
+    # No submission is being judged yet; the markers are left over from an earlier run
+    handler._check_and_remove(*[os.path.join(MONITOR_DIRECTORY, name)
+                                for name in os.listdir(MONITOR_DIRECTORY)
+                                if name.startswith('running_')])
+
+    for _ in range(BULK_REJUDGE_WORKERS):
+        Thread(target=_bulk_rejudge_worker, daemon=True).start()
+
+    while True:
+        try:
+            # The folder is listed again for every job, so that a new submission is
+            # judged next, however many jobs are queued
+            claimed = _next_job(LIVE_JOB_PREFIXES)
+            if claimed is None:
+                sleep(SLEEP_DUR_BEFORE_REFRESH)
+            else:
+                _run_claimed(*claimed)
+        # A failed job must not stop the watcher; its job file is listed again if it is left
+        except Exception:
+            print_exc()
+            # The database connection is opened again if it has failed
+            connection.close()
+
+
+if __name__ == '__main__':
+    main()